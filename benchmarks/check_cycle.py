@@ -0,0 +1,338 @@
+# benchmarks/check_cycle.py
+"""Замеряет цикл проверок на локальной ферме сайтов (``benchmarks.site_farm``).
+
+Запуск полностью офлайн::
+
+    python -m benchmarks.check_cycle --sites 5000 --cycles 3 --output before.json
+    python -m benchmarks.check_cycle --sites 5000 --cycles 3 --compare before.json
+
+Режимы:
+
+* ``engine`` — только ``check_websites_async`` (без БД и Redis); с
+  ``--processes N`` сайты делятся между N процессами со своим event loop
+  в каждом, как подзадачи цикла в пуле prefork воркера;
+* ``cycle`` — полный ``check_sites_sync``: стриминг рабочего набора из БД,
+  проверки, запись статусов, истории и кэша. Нужны PostgreSQL и Redis
+  из настроек .env; скрипт создаёт временного пользователя с N сайтами
+  и удаляет тестовые данные в конце.
+
+Параметры движка берутся из настроек (``CHECK_CONCURRENCY``,
+``CHECK_TIMEOUT_SECONDS``, ``CHECK_RETRIES``, ``CHECK_PROBE_METHOD`` и т.д.).
+Для каждого цикла записываются время, проверки в секунду, CPU процесса,
+пиковый RSS и (в режиме engine) принятые байты на проверку; ферма
+работает в отдельном процессе и в замеры не попадает. Результат — JSON
+(stdout и ``--output``), ``--compare`` печатает изменения относительно
+сохранённого прогона.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional
+from benchmarks.site_farm import (
+    DEFAULT_MIX,
+    FarmConfig,
+    SiteFarm,
+    farm_hosts,
+    parse_mix,
+    pin_farm_hosts,
+    unlimit_farm_domain,
+)
+from shared.config import settings
+from shared.http_client import run_in_process_loop
+from shared.monitoring import check_websites_async
+
+BENCHMARK_TELEGRAM_ID = -1000002
+# Профили, на которых сайт должен оказаться доступным после редиректов
+_AVAILABLE_PROFILES = {"ok", "redirect", "slowbody", "nohead"}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss — в КБ на Linux и в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_engine_cycle(urls: List[str], **engine_kwargs) -> dict:
+    results = run_in_process_loop(check_websites_async(urls, **engine_kwargs))
+    up = sum(result.is_available for result in results)
+    return {
+        "checked": len(results),
+        "up": up,
+        "down": len(results) - up,
+        "errors": Counter(result.error for result in results if result.error),
+        "bytes_received": sum(result.bytes_received for result in results),
+    }
+
+
+def _engine_worker(urls: List[str]) -> dict:
+    """Часть цикла в процессе пула: свой event loop, свои клиенты."""
+    cpu_before = _cpu_seconds()
+    outcome = run_engine_cycle(urls)
+    outcome["worker_cpu_seconds"] = _cpu_seconds() - cpu_before
+    outcome["worker_peak_rss_mb"] = _peak_rss_mb()
+    return outcome
+
+
+def run_parallel_engine_cycle(pool, urls: List[str], processes: int) -> dict:
+    merged = {
+        "checked": 0,
+        "up": 0,
+        "down": 0,
+        "errors": Counter(),
+        "bytes_received": 0,
+        "worker_cpu_seconds": 0.0,
+        "worker_peak_rss_mb": 0.0,
+    }
+    slices = [urls[start::processes] for start in range(processes)]
+    for outcome in pool.map(_engine_worker, slices):
+        for key in ("checked", "up", "down", "bytes_received", "worker_cpu_seconds"):
+            merged[key] += outcome[key]
+        merged["errors"].update(outcome["errors"])
+        merged["worker_peak_rss_mb"] = max(
+            merged["worker_peak_rss_mb"], outcome["worker_peak_rss_mb"]
+        )
+    return merged
+
+
+def seed_sites(hosts: List[tuple], port: int) -> List[int]:
+    from sqlalchemy import insert
+    from sqlalchemy.future import select
+    from shared.db import SyncSessionFactory
+    from shared.models import Site, User
+
+    with SyncSessionFactory() as session:
+        user_id = session.execute(
+            insert(User)
+            .values(telegram_id=BENCHMARK_TELEGRAM_ID, username="benchmark")
+            .returning(User.id)
+        ).scalar_one()
+        # Статус совпадает с ожидаемым: замеряется установившийся цикл без
+        # смен статуса и уведомлений
+        session.execute(
+            insert(Site),
+            [
+                {
+                    "url": f"http://{host}:{port}/",
+                    "user_id": user_id,
+                    "is_available": profile in _AVAILABLE_PROFILES,
+                }
+                for profile, host in hosts
+            ],
+        )
+        session.commit()
+        return (
+            session.execute(select(Site.id).filter(Site.user_id == user_id))
+            .scalars()
+            .all()
+        )
+
+
+def cleanup() -> None:
+    from sqlalchemy import delete
+    from sqlalchemy.future import select
+    from shared.db import SyncSessionFactory
+    from shared.models import Site, SiteCheck, User
+
+    with SyncSessionFactory() as session:
+        user_ids = select(User.id).filter(User.telegram_id == BENCHMARK_TELEGRAM_ID)
+        site_ids = select(Site.id).filter(Site.user_id.in_(user_ids))
+        session.execute(delete(SiteCheck).filter(SiteCheck.site_id.in_(site_ids)))
+        session.execute(delete(Site).filter(Site.user_id.in_(user_ids)))
+        session.execute(delete(User).filter(User.telegram_id == BENCHMARK_TELEGRAM_ID))
+        session.commit()
+
+
+def measure(run) -> dict:
+    cpu_before = _cpu_seconds()
+    started = time.perf_counter()
+    outcome = run()
+    wall = time.perf_counter() - started
+    # CPU процессов пула считается вместе с основным
+    cpu = _cpu_seconds() - cpu_before + outcome.get("worker_cpu_seconds", 0.0)
+    return {
+        "wall_seconds": round(wall, 3),
+        "checks_per_second": round(outcome["checked"] / wall, 1) if wall else None,
+        "cpu_seconds": round(cpu, 3),
+        "cpu_utilization": round(cpu / wall, 3) if wall else None,
+        "peak_rss_mb": round(
+            max(_peak_rss_mb(), outcome.get("worker_peak_rss_mb", 0.0)), 1
+        ),
+        **{key: outcome[key] for key in ("checked", "up", "down")},
+        "errors": dict(outcome.get("errors") or {}),
+        **(
+            {
+                "bytes_received": outcome["bytes_received"],
+                "bytes_per_check": round(
+                    outcome["bytes_received"] / max(outcome["checked"], 1)
+                ),
+            }
+            if "bytes_received" in outcome
+            else {}
+        ),
+    }
+
+
+def summarize(cycles: List[dict]) -> dict:
+    walls = [cycle["wall_seconds"] for cycle in cycles]
+    rates = [cycle["checks_per_second"] or 0 for cycle in cycles]
+    return {
+        "wall_seconds_median": round(statistics.median(walls), 3),
+        "wall_seconds_min": min(walls),
+        "checks_per_second_median": round(statistics.median(rates), 1),
+        "cpu_seconds_median": round(
+            statistics.median(cycle["cpu_seconds"] for cycle in cycles), 3
+        ),
+        "peak_rss_mb": max(cycle["peak_rss_mb"] for cycle in cycles),
+    }
+
+
+def compare(report: dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(
+        f"Compared with {baseline_path} "
+        f"(revision {baseline.get('revision')}, {baseline.get('params')})",
+        file=sys.stderr,
+    )
+    for key, value in report["summary"].items():
+        before = baseline.get("summary", {}).get(key)
+        if not before:
+            continue
+        change = (value - before) / before * 100
+        print(f"  {key}: {before} -> {value} ({change:+.1f}%)", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("engine", "cycle"), default="engine")
+    parser.add_argument("--sites", type=int, default=5000)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="процессов проверки в режиме engine (как пул prefork воркера)",
+    )
+    parser.add_argument("--farm-processes", type=int, default=1, help="процессов фермы")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="доли профилей фермы")
+    parser.add_argument("--latency-ms", type=float, default=FarmConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=FarmConfig.jitter_ms)
+    parser.add_argument("--page-bytes", type=int, default=FarmConfig.page_bytes)
+    parser.add_argument(
+        "--hang-seconds",
+        type=float,
+        default=None,
+        help="сколько «висит» профиль timeout (по умолчанию таймаут проверки + 5с)",
+    )
+    parser.add_argument(
+        "--polite",
+        action="store_true",
+        help="оставить лимиты CHECK_DOMAIN_* для домена фермы",
+    )
+    parser.add_argument("--output", help="куда сохранить JSON с результатами")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    config = FarmConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        page_bytes=args.page_bytes,
+        hang_seconds=(
+            args.hang_seconds
+            if args.hang_seconds is not None
+            else settings.check_timeout_seconds + 5
+        ),
+    )
+    hosts = farm_hosts(args.sites, parse_mix(args.mix))
+    cycles = []
+    if not args.polite:
+        unlimit_farm_domain()
+    pool = None
+    with SiteFarm(config, processes=args.farm_processes) as farm:
+        pin_farm_hosts([host for _, host in hosts], farm.port)
+        if args.mode == "engine" and args.processes > 1:
+            urls = [f"http://{host}:{farm.port}/" for _, host in hosts]
+            # fork после pin_farm_hosts: процессы наследуют кэш DNS с фермой
+            pool = multiprocessing.get_context("fork").Pool(args.processes)
+            run = lambda: run_parallel_engine_cycle(  # noqa: E731
+                pool, urls, args.processes
+            )
+        elif args.mode == "engine":
+            urls = [f"http://{host}:{farm.port}/" for _, host in hosts]
+            run = lambda: run_engine_cycle(urls)  # noqa: E731
+        else:
+            from bot.monitoring import check_sites_sync
+
+            cleanup()
+            site_ids = seed_sites(hosts, farm.port)
+            run = lambda: check_sites_sync(site_ids)  # noqa: E731
+        try:
+            for number in range(1, args.cycles + 1):
+                cycle = measure(run)
+                cycles.append(cycle)
+                print(
+                    f"Cycle {number}: {cycle['wall_seconds']}s, "
+                    f"{cycle['checks_per_second']} checks/s, "
+                    f"cpu {cycle['cpu_seconds']}s, rss {cycle['peak_rss_mb']} MB",
+                    file=sys.stderr,
+                )
+        finally:
+            if pool is not None:
+                pool.terminate()
+            if args.mode == "cycle":
+                cleanup()
+
+    report = {
+        "benchmark": "check_cycle",
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": {
+            **vars(args),
+            "check_concurrency": settings.check_concurrency,
+            "check_timeout_seconds": settings.check_timeout_seconds,
+            "check_retries": settings.check_retries,
+            "check_probe_method": settings.check_probe_method,
+        },
+        "farm": config.__dict__,
+        "cycles": cycles,
+        "summary": summarize(cycles),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# benchmarks/h2_farm.py
+"""TLS-ферма для замеров HTTP/2: один asyncio-сервер с ALPN h2 и http/1.1.
+
+Хосты ``h2-N.farm.test`` договариваются о HTTP/2, ``h1-N.farm.test`` — только
+о HTTP/1.1 (выбор контекста по SNI), так что видно и мультиплексирование,
+и откат движка на пул HTTP/1.1. Любой путь отвечает 200 с задержкой
+``latency_ms`` ± ``jitter_ms``; на HEAD — только заголовки.
+
+На localhost новое соединение почти бесплатно, поэтому ``connect_ms``
+задерживает первый ответ каждого соединения — так моделируются RTT
+TCP- и TLS-рукопожатий до удалённого хоста. Число принятых соединений
+доступно в ``H2Farm.connections``.
+
+Самоподписанный сертификат на ``*.farm.test`` создаётся утилитой ``openssl``
+во временном каталоге; ``trust_farm_certificate`` добавляет его в общий
+SSL-контекст процесса, которым пользуются и aiohttp, и HTTP/2-клиент.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import ssl
+import subprocess
+import tempfile
+from dataclasses import asdict
+from typing import Optional
+import h11
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from h2.events import ConnectionTerminated, RequestReceived
+from h2.exceptions import H2Error
+from h2.settings import SettingCodes
+from benchmarks.site_farm import FARM_DOMAIN, FarmConfig, response_delay, free_port
+from shared.http_client import get_ssl_context
+
+# Типичный предел одновременных потоков у серверов (nginx — 128)
+MAX_CONCURRENT_STREAMS = 128
+
+
+def create_certificate(directory: str) -> tuple:
+    """(cert, key) самоподписанного сертификата на ``*.farm.test``."""
+    cert = os.path.join(directory, "farm.pem")
+    key = os.path.join(directory, "farm.key")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", key, "-out", cert, "-days", "1",
+            "-subj", f"/CN={FARM_DOMAIN}",
+            "-addext", f"subjectAltName=DNS:*.{FARM_DOMAIN}",
+        ],
+        check=True,
+        capture_output=True,
+    )  # fmt: skip
+    return cert, key
+
+
+def trust_farm_certificate(cert: str) -> None:
+    get_ssl_context().load_verify_locations(cert)
+
+
+def _server_context(cert: str, key: str, protocols: list) -> ssl.SSLContext:
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    context.set_alpn_protocols(protocols)
+    return context
+
+
+async def _serve_h2(reader, writer, config: FarmConfig) -> None:
+    conn = H2Connection(H2Configuration(client_side=False, header_encoding="utf-8"))
+    conn.initiate_connection()
+    conn.update_settings({SettingCodes.MAX_CONCURRENT_STREAMS: MAX_CONCURRENT_STREAMS})
+    writer.write(conn.data_to_send())
+    tasks = set()
+
+    async def respond(stream_id: int, head: bool) -> None:
+        await asyncio.sleep(response_delay(config))
+        try:
+            conn.send_headers(
+                stream_id,
+                [(":status", "200"), ("content-type", "text/plain")],
+                end_stream=head,
+            )
+            if not head:
+                # Тело — сколько позволяет окно потока (клиент его не читает)
+                window = conn.local_flow_control_window(stream_id)
+                conn.send_data(
+                    stream_id, b"x" * min(config.page_bytes, window), end_stream=True
+                )
+            writer.write(conn.data_to_send())
+        except (H2Error, ConnectionError):
+            pass  # Клиент уже сбросил поток или закрыл соединение
+
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, RequestReceived):
+                    headers = dict(event.headers)
+                    task = asyncio.create_task(
+                        respond(event.stream_id, headers.get(":method") == "HEAD")
+                    )
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif isinstance(event, ConnectionTerminated):
+                    return
+            writer.write(conn.data_to_send())
+    except (H2Error, ConnectionError):
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        writer.close()
+
+
+async def _serve_h1(reader, writer, config: FarmConfig) -> None:
+    conn = h11.Connection(h11.SERVER)
+    page = b"x" * config.page_bytes
+    method = b"GET"
+    try:
+        while True:
+            event = conn.next_event()
+            if event is h11.NEED_DATA:
+                conn.receive_data(await reader.read(65536))
+            elif isinstance(event, h11.Request):
+                method = event.method
+            elif isinstance(event, h11.EndOfMessage):
+                await asyncio.sleep(response_delay(config))
+                body = b"" if method == b"HEAD" else page
+                headers = [("content-type", "text/plain")]
+                headers.append(("content-length", str(len(page))))
+                writer.write(conn.send(h11.Response(status_code=200, headers=headers)))
+                if body:
+                    writer.write(conn.send(h11.Data(data=body)))
+                writer.write(conn.send(h11.EndOfMessage()))
+                await writer.drain()
+                conn.start_next_cycle()
+            else:  # ConnectionClosed
+                break
+    except (h11.ProtocolError, ConnectionError):
+        pass  # Клиент закрыл соединение, не дочитав тело
+    finally:
+        writer.close()
+
+
+def _serve(
+    config: dict, port: int, cert: str, key: str, connect_ms: float, connections, ready
+) -> None:
+    config = FarmConfig(**config)
+    context = _server_context(cert, key, ["h2", "http/1.1"])
+    http1_context = _server_context(cert, key, ["http/1.1"])
+
+    def choose_context(ssl_object, server_name, _):
+        if server_name and server_name.startswith("h1-"):
+            ssl_object.context = http1_context
+
+    context.sni_callback = choose_context
+
+    async def handle(reader, writer) -> None:
+        with connections.get_lock():
+            connections.value += 1
+        await asyncio.sleep(connect_ms / 1000)
+        ssl_object = writer.get_extra_info("ssl_object")
+        if ssl_object.selected_alpn_protocol() == "h2":
+            await _serve_h2(reader, writer, config)
+        else:
+            await _serve_h1(reader, writer, config)
+
+    async def main() -> None:
+        server = await asyncio.start_server(
+            handle, "127.0.0.1", port, ssl=context, backlog=4096
+        )
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+class H2Farm:
+    """TLS-ферма в отдельном процессе (см. ``benchmarks.site_farm.SiteFarm``)."""
+
+    def __init__(self, config: FarmConfig, port: int = 0, connect_ms: float = 0.0):
+        self.config = config
+        self.port = port or free_port()
+        self.connect_ms = connect_ms
+        self._connections = multiprocessing.Value("i", 0)
+        self._process = None
+        self._tmpdir: Optional[tempfile.TemporaryDirectory] = None
+        self.cert = None
+
+    def __enter__(self) -> "H2Farm":
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.cert, key = create_certificate(self._tmpdir.name)
+        ready = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=_serve,
+            args=(
+                asdict(self.config),
+                self.port,
+                self.cert,
+                key,
+                self.connect_ms,
+                self._connections,
+                ready,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        if not ready.wait(10):
+            self._process.terminate()
+            raise RuntimeError("HTTP/2 farm did not start in 10s")
+        return self
+
+    @property
+    def connections(self) -> int:
+        """Соединения, принятые фермой с момента запуска."""
+        return self._connections.value
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._process.terminate()
+        self._process.join(5)
+        self._tmpdir.cleanup()
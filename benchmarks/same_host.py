@@ -0,0 +1,140 @@
+# benchmarks/same_host.py
+"""Сравнивает проверку многих путей одного хоста по HTTP/1.1 и по HTTP/2.
+
+Запуск полностью офлайн (нужна утилита ``openssl``)::
+
+    python -m benchmarks.same_host --hosts 10 --paths 200 --output h2.json
+
+На TLS-ферме (``benchmarks.h2_farm``) поднимаются ``--hosts`` хостов по
+``--paths`` путей; доля ``--h1-share`` хостов умеет только HTTP/1.1.
+Один и тот же набор URL проверяется движком с выключенным и включённым
+HTTP/2; для каждого варианта записываются время цикла, проверки в секунду,
+CPU и пиковый RSS, как в ``benchmarks.check_cycle``, и число новых
+соединений к ферме. ``--connect-ms`` — стоимость установки соединения
+(RTT рукопожатий); при 0 соединения на localhost почти бесплатны
+и сравнивается в основном CPU клиентов.
+
+Замеры (4 хоста × 50 путей, ``--connect-ms 100``, 3 цикла): HTTP/2 сокращает
+число соединений с 200 до 53, но не ускоряет проверки. Первый цикл по HTTP/2
+медленнее и дороже по CPU (1,03–1,05 с и 0,63–0,66 с CPU против 0,96–0,97 с
+и 0,43 с по HTTP/1.1). Медианы циклов в разных прогонах расходятся в обе
+стороны: 1,045 с против 0,962 с в одном и 0,595 с против 0,832 с в другом.
+Выигрыш HTTP/2 — меньше соединений и рукопожатий с проверяемыми хостами,
+а не пропускная способность.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+from datetime import datetime, timezone
+from benchmarks.check_cycle import (
+    git_revision,
+    compare,
+    measure,
+    run_engine_cycle,
+    summarize,
+)
+from benchmarks.h2_farm import H2Farm, trust_farm_certificate
+from benchmarks.site_farm import (
+    FARM_DOMAIN,
+    FarmConfig,
+    pin_farm_hosts,
+    unlimit_farm_domain,
+)
+from shared.config import settings
+from shared.http_client import (
+    close_async_session,
+    http2_available,
+    run_in_process_loop,
+)
+
+VARIANTS = {"http1": False, "http2": True}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=10)
+    parser.add_argument("--paths", type=int, default=200)
+    parser.add_argument("--h1-share", type=float, default=0.2)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=FarmConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=FarmConfig.jitter_ms)
+    parser.add_argument("--connect-ms", type=float, default=100.0)
+    parser.add_argument(
+        "--polite",
+        action="store_true",
+        help="оставить лимиты CHECK_DOMAIN_* для домена фермы",
+    )
+    parser.add_argument("--output", help="куда сохранить JSON с результатами")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+    if not http2_available():
+        sys.exit("httpx[http2] is not installed: nothing to compare")
+
+    config = FarmConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    h1_hosts = round(args.hosts * args.h1_share)
+    hosts = [
+        f"{'h1' if i < h1_hosts else 'h2'}-{i}.{FARM_DOMAIN}" for i in range(args.hosts)
+    ]
+    report = {
+        "benchmark": "same_host",
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": {
+            **vars(args),
+            "check_concurrency": settings.check_concurrency,
+            "check_probe_method": settings.check_probe_method,
+            "http2_min_group_size": settings.http2_min_group_size,
+        },
+        "variants": {},
+        "summary": {},
+    }
+    if not args.polite:
+        unlimit_farm_domain()
+    with H2Farm(config, connect_ms=args.connect_ms) as farm:
+        trust_farm_certificate(farm.cert)
+        pin_farm_hosts(hosts, farm.port)
+        urls = [
+            f"https://{host}:{farm.port}/path/{path}"
+            for host in hosts
+            for path in range(args.paths)
+        ]
+        for variant, http2 in VARIANTS.items():
+            cycles = []
+            for number in range(1, args.cycles + 1):
+                # Интервал цикла больше keep-alive: каждый цикл начинается без
+                # открытых соединений, как в воркере
+                run_in_process_loop(close_async_session())
+                connections = farm.connections
+                cycle = measure(lambda: run_engine_cycle(urls, http2=http2))
+                cycle["connections"] = farm.connections - connections
+                cycles.append(cycle)
+                print(
+                    f"{variant} cycle {number}: {cycle['wall_seconds']}s, "
+                    f"{cycle['checks_per_second']} checks/s, "
+                    f"cpu {cycle['cpu_seconds']}s, "
+                    f"{cycle['connections']} connections, "
+                    f"up {cycle['up']}/{cycle['checked']}",
+                    file=sys.stderr,
+                )
+            summary = summarize(cycles)
+            summary["connections_median"] = statistics.median(
+                cycle["connections"] for cycle in cycles
+            )
+            report["variants"][variant] = {"cycles": cycles, "summary": summary}
+            report["summary"].update(
+                {f"{variant}_{key}": value for key, value in summary.items()}
+            )
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
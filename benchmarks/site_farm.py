@@ -0,0 +1,206 @@
+# benchmarks/site_farm.py
+"""Локальная «ферма сайтов» для бенчмарков: один aiohttp-сервер, тысячи хостов.
+
+Виртуальный хост выбирается по заголовку Host, а поведение — по префиксу
+имени (``ok-17.farm.test``, ``timeout-3.farm.test`` и т.д.):
+
+* ``ok`` — 200 со страницей ``page_bytes`` и задержкой ``latency_ms`` ± ``jitter_ms``;
+* ``error`` — 500/503 с той же задержкой;
+* ``timeout`` — ответ не приходит ``hang_seconds`` (больше таймаута проверки);
+* ``redirect`` — 302 на ``/landing`` того же хоста, затем 200;
+* ``slowbody`` — заголовки сразу, тело по ``chunk_size`` байт каждые ``chunk_delay_ms``;
+* ``nohead`` — 405 на ``HEAD``, на ``GET`` — как ``ok``.
+
+Все имена разрешаются в 127.0.0.1 через общий ``DNSCache`` процесса
+(``pin_farm_hosts``), поэтому ферма работает без сети и без правки /etc/hosts.
+Отдельный запуск для ручной проверки::
+
+    python -m benchmarks.site_farm --port 8089
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import socket
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Tuple
+from aiohttp import web
+from shared.config import settings
+from shared.dns_cache import get_dns_cache
+
+FARM_DOMAIN = "farm.test"
+PROFILES = ("ok", "error", "timeout", "redirect", "slowbody", "nohead")
+DEFAULT_MIX = "ok=0.83,error=0.05,timeout=0.03,redirect=0.05,slowbody=0.02,nohead=0.02"
+
+
+@dataclass
+class FarmConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 25.0
+    page_bytes: int = 50_000
+    hang_seconds: float = 30.0
+    chunk_size: int = 1024
+    chunk_delay_ms: float = 200.0
+    body_chunks: int = 10
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """``"ok=0.9,error=0.1"`` -> доли профилей (нормированные к 1)."""
+    shares = {}
+    for part in mix.split(","):
+        name, _, share = part.partition("=")
+        name = name.strip()
+        if name not in PROFILES:
+            raise ValueError(f"Unknown profile {name!r}, expected one of {PROFILES}")
+        shares[name] = float(share)
+    total = sum(shares.values())
+    if total <= 0:
+        raise ValueError("Profile mix must have a positive total share")
+    return {name: share / total for name, share in shares.items()}
+
+
+def farm_hosts(count: int, mix: Dict[str, float]) -> List[Tuple[str, str]]:
+    """(профиль, имя хоста) для ``count`` сайтов в заданной пропорции."""
+    hosts = []
+    for name, share in mix.items():
+        hosts.extend(
+            (name, f"{name}-{i}.{FARM_DOMAIN}") for i in range(round(count * share))
+        )
+    # Округление долей может дать на пару сайтов больше или меньше
+    while len(hosts) < count:
+        hosts.append(("ok", f"ok-extra{len(hosts)}.{FARM_DOMAIN}"))
+    return hosts[:count]
+
+
+def pin_farm_hosts(hosts: List[str], port: int) -> None:
+    """Разрешает имена фермы в 127.0.0.1 через DNSCache текущего процесса."""
+    cache = get_dns_cache()
+    for host in hosts:
+        cache.pin(host, "127.0.0.1", port)
+
+
+def unlimit_farm_domain() -> None:
+    """Снимает лимиты вежливости с домена фермы: все её хосты — один
+    регистрируемый домен ``farm.test``, и лимит замерял бы только себя."""
+    settings.check_domain_limits = {**settings.check_domain_limits, FARM_DOMAIN: (0, 0)}
+
+
+def response_delay(config: FarmConfig) -> float:
+    jitter = random.uniform(-config.jitter_ms, config.jitter_ms)
+    return max(0.0, config.latency_ms + jitter) / 1000
+
+
+def make_app(config: FarmConfig) -> web.Application:
+    async def handle(request: web.Request) -> web.StreamResponse:
+        profile = request.host.split(".", 1)[0].split("-", 1)[0]
+        if profile == "timeout":
+            await asyncio.sleep(config.hang_seconds)
+            return web.Response(status=504)
+        await asyncio.sleep(response_delay(config))
+        if profile == "nohead" and request.method == "HEAD":
+            raise web.HTTPMethodNotAllowed("HEAD", ["GET"])
+        if profile == "error":
+            return web.Response(status=random.choice((500, 503)), text="error")
+        if profile == "redirect" and request.path != "/landing":
+            raise web.HTTPFound("/landing")
+        if profile == "slowbody":
+            response = web.StreamResponse(status=200)
+            response.content_length = config.chunk_size * config.body_chunks
+            await response.prepare(request)
+            if request.method == "HEAD":
+                return response  # Тело на HEAD испортило бы keep-alive соединение
+            chunk = b"x" * config.chunk_size
+            try:
+                for _ in range(config.body_chunks):
+                    await response.write(chunk)
+                    await asyncio.sleep(config.chunk_delay_ms / 1000)
+                await response.write_eof()
+            except ConnectionResetError:
+                pass  # Проверке хватило заголовков, клиент закрыл соединение
+            return response
+        return web.Response(body=page)
+
+    page = b"x" * config.page_bytes
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handle)
+    return app
+
+
+def _serve(config: dict, port: int, reuse_port: bool, ready) -> None:
+    async def main() -> None:
+        runner = web.AppRunner(make_app(FarmConfig(**config)), access_log=None)
+        await runner.setup()
+        # Большой backlog: в начале цикла приходят тысячи соединений разом
+        site = web.TCPSite(
+            runner, "127.0.0.1", port, backlog=4096, reuse_port=reuse_port or None
+        )
+        await site.start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+class SiteFarm:
+    """Ферма в отдельных процессах, чтобы её CPU не попадал в замеры.
+
+    При ``processes`` > 1 процессы слушают один порт (SO_REUSEPORT), чтобы
+    ферма не стала узким местом для многопроцессных проверок.
+    """
+
+    def __init__(self, config: FarmConfig, port: int = 0, processes: int = 1):
+        self.config = config
+        self.port = port or free_port()
+        self.processes = processes
+        self._processes = []
+
+    def __enter__(self) -> "SiteFarm":
+        for _ in range(self.processes):
+            ready = multiprocessing.Event()
+            process = multiprocessing.Process(
+                target=_serve,
+                args=(asdict(self.config), self.port, self.processes > 1, ready),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+            if not ready.wait(10):
+                self.__exit__(None, None, None)
+                raise RuntimeError("Site farm did not start in 10s")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(5)
+        self._processes = []
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=FarmConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=FarmConfig.jitter_ms)
+    parser.add_argument("--page-bytes", type=int, default=FarmConfig.page_bytes)
+    parser.add_argument("--hang-seconds", type=float, default=FarmConfig.hang_seconds)
+    args = parser.parse_args()
+    config = FarmConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        page_bytes=args.page_bytes,
+        hang_seconds=args.hang_seconds,
+    )
+    print(f"Site farm on 127.0.0.1:{args.port} (Host: <profile>-N.{FARM_DOMAIN})")
+    web.run_app(make_app(config), host="127.0.0.1", port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
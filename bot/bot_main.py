@@ -6,7 +6,11 @@ from aiogram.enums import ParseMode
 from shared.config import settings
 from shared.db import init_db, AsyncSessionFactory, User
 from shared.logger_setup import logger
+from shared.metrics import start_metrics_server
+from shared.notifications import NotificationDispatcher
+from shared.http_client import close_async_session
 from bot.handlers import router as main_router
+from bot.middlewares import HandlerTimingMiddleware
 from bot.celery_app import initialize_celery_schedule
 
 bot = Bot(
@@ -22,11 +26,21 @@ async def main() -> None:
     except Exception as e:
         logger.critical(f"Failed to initialize database or Celery: {e}", exc_info=True)
         return
+    start_metrics_server(settings.bot_metrics_port)
     dp = Dispatcher()
+    dp.message.middleware(HandlerTimingMiddleware())
+    dp.callback_query.middleware(HandlerTimingMiddleware())
     dp.include_router(main_router)
+    dispatcher = NotificationDispatcher()
+    dispatcher_task = asyncio.create_task(dispatcher.run())
     logger.info("Deleting webhook and starting polling...")
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
+    finally:
+        dispatcher.stop()
+        await dispatcher_task
+        await close_async_session()
     logger.info("Bot polling stopped.")
 
 
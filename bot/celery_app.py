@@ -119,10 +119,19 @@
 #     logger.debug("Detected Celery Beat process, initializing schedule...")
 #     initialize_celery_schedule()
 from celery import Celery
+from celery.signals import (
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+from shared import db, dns_cache, http_client, redis_client
 from shared.config import settings
+from shared.http_client import close_http_clients
 from shared.logger_setup import logger
+from shared.metrics import mark_process_dead, start_metrics_server
 from shared.db import get_system_setting_sync
-from datetime import timedelta
+from datetime import datetime, timedelta
 import os
 import shelve
 import traceback
@@ -147,7 +156,12 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=300,
     task_soft_time_limit=270,
-    worker_concurrency=8,
+    # Пул prefork: в каждом процессе свой event loop и свои клиенты,
+    # подзадачи цикла (check_sites_chunk) расходятся по процессам
+    worker_concurrency=settings.worker_concurrency or os.cpu_count(),
+    # По одной задаче на процесс: иначе один процесс заберёт несколько
+    # подзадач цикла, пока остальные простаивают
+    worker_prefetch_multiplier=1,
     broker_connection_retry_on_startup=True,
     worker_log_format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     task_log_format="%(asctime)s - %(name)s - %(levelname)s - Task %(task_name)s[%(task_id)s]: %(message)s",
@@ -161,6 +175,35 @@ celery_app.conf.update(
 current_check_interval_minutes = None
 
 
+@worker_init.connect
+def start_worker_metrics_exporter(**kwargs):
+    """Экспортёр метрик воркера в главном процессе; метрики дочерних процессов
+    пула он сводит через PROMETHEUS_MULTIPROC_DIR (см. shared/metrics.py)."""
+    start_metrics_server(settings.worker_metrics_port)
+
+
+@worker_process_init.connect
+def reset_worker_process_state(**kwargs):
+    """Дочерний процесс пула prefork не пользуется соединениями родителя:
+    пулы БД, клиенты Redis и HTTP, кэш DNS и event loop создаются заново."""
+    db.reset_after_fork()
+    redis_client.reset_after_fork()
+    http_client.reset_after_fork()
+    dns_cache.reset_after_fork()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_worker_http_clients(**kwargs):
+    """Закрывает общие HTTP-клиенты процесса воркера при остановке."""
+    close_http_clients()
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+
 class ErrorInfo:
     def __init__(self, exception: Exception, task_name: Optional[str] = None):
         self.exception = exception
@@ -211,11 +254,26 @@ def set_beat_schedule(check_interval_minutes: int):
         )
         return
     try:
-        check_interval = timedelta(minutes=check_interval_minutes)
+        # Beat лишь часто «тикает»: какие сайты проверять, решает планировщик
+        # по времени следующей проверки. Глобальный интервал тик читает из БД
+        # как интервал по умолчанию для сайтов без собственного.
+        tick_interval = timedelta(
+            seconds=min(settings.scheduler_tick_seconds, check_interval_minutes * 60)
+        )
         celery_app.conf.beat_schedule = {
-            f"run-monitoring-check-every-{check_interval_minutes}-minutes": {
+            "run-monitoring-check-tick": {
                 "task": "bot.monitoring.run_monitoring_check",
-                "schedule": check_interval,
+                "schedule": tick_interval,
+            },
+            "rollup-site-checks": {
+                "task": "bot.monitoring.rollup_site_checks",
+                "schedule": timedelta(seconds=settings.rollup_interval_seconds),
+            },
+            # Секции site_checks создаются на несколько суток вперёд,
+            # так что раз в час с запасом
+            "maintain-site-check-partitions": {
+                "task": "bot.monitoring.maintain_site_check_partitions",
+                "schedule": timedelta(hours=1),
             },
         }
         current_check_interval_minutes = check_interval_minutes
@@ -283,26 +341,6 @@ def update_check_interval(check_interval_minutes: int):
         )
 
 
-@celery_app.task
-def run_monitoring_check():
-    logger.info("Running scheduled monitoring check...")
-    try:
-        from bot.monitoring import check_all_sites_sync
-
-        check_all_sites_sync()
-        logger.info("Completed scheduled monitoring check")
-    except Exception as e:
-        error_info = ErrorInfo(e, task_name="run_monitoring_check")
-        logger.error(
-            "Ошибка %s: %s\nМестоположение: %s\nTraceback: %s",
-            error_info.exception_name,
-            error_info.exception_message,
-            error_info.error_location.replace("\n", " | "),
-            error_info.traceback_snippet,
-        )
-        raise
-
-
 if os.environ.get("RUN_CELERY_BEAT", "0") == "1":
     logger.debug("Detected Celery Beat process, initializing schedule...")
     initialize_celery_schedule()
@@ -1,6 +1,6 @@
 # bot/handlers.py
 from aiogram import Router, F
-from aiogram.filters import CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.types import Message, CallbackQuery, ErrorEvent
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
@@ -9,6 +9,9 @@ from shared.db import (
     get_or_create_user,
     get_user_sites,
     delete_site_by_id,
+    get_sites_uptime,
+    resolve_uptime_window,
+    UPTIME_WINDOWS,
     AsyncSessionFactory,
 )
 from shared.models import User, Site
@@ -16,8 +19,13 @@ from sqlalchemy.future import select
 from shared.logger_setup import logger
 from bot.fsm import AddSite
 from bot.keyboards import get_main_menu_keyboard, get_sites_keyboard, get_back_keyboard
-from shared.monitoring import update_site_availability
-from datetime import datetime
+from shared.monitoring import parse_site_url, probe_target, update_site_availability
+from shared.latency import format_percentiles, get_latency_percentiles_async
+from shared.scheduler import schedule_site_now
+from shared.status_cache import invalidate_user_sites
+from datetime import datetime, timedelta
+import html
+import re
 import traceback
 from typing import Optional
 
@@ -199,6 +207,133 @@ async def command_start_handler(message: Message) -> None:
         await handle_db_error(message, "start command")
 
 
+UPTIME_USAGE = (
+    "Использование: /uptime [сайт] [окно]\n"
+    "• сайт — ID или URL из списка ваших сайтов (по умолчанию все);\n"
+    f"• окно — {', '.join(UPTIME_WINDOWS)} или даты ГГГГ-ММ-ДД [ГГГГ-ММ-ДД].\n"
+    "Например: /uptime 12 7d, /uptime https://example.com 2024-05-01 2024-05-08"
+)
+
+
+_UPTIME_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _parse_uptime_date(value: str, end: bool = False) -> datetime:
+    moment = datetime.fromisoformat(value)
+    # Дата без времени в конце окна включает весь этот день
+    if end and len(value) == 10:
+        moment += timedelta(days=1)
+    return moment
+
+
+def _parse_uptime_args(args: Optional[str]) -> tuple:
+    """(сайт, окно, начало, конец) из аргументов команды /uptime."""
+    selector = window = start = end = None
+    dates = []
+    for token in (args or "").split():
+        if token in UPTIME_WINDOWS:
+            window = token
+        elif _UPTIME_DATE.match(token):
+            dates.append(token)
+        elif selector is None:
+            selector = token
+        else:
+            raise ValueError(f"Unexpected argument {token!r}")
+    if len(dates) > 2 or (dates and window):
+        raise ValueError("Use either a named window or one or two dates")
+    if dates:
+        start = _parse_uptime_date(dates[0])
+        end = _parse_uptime_date(dates[1], end=True) if len(dates) > 1 else None
+    return selector, window, start, end
+
+
+def _match_site(rows: list, selector: str) -> Optional[dict]:
+    """Сайт по ID или URL (схема и завершающий «/» не обязательны)."""
+
+    def bare(url: str) -> str:
+        return url.split("://", 1)[-1].rstrip("/").lower()
+
+    for row in rows:
+        if selector == str(row["site_id"]) or bare(selector) == bare(row["url"]):
+            return row
+    return None
+
+
+def _format_uptime(row: dict) -> str:
+    uptime = row.get("uptime_percent")
+    if uptime is None:
+        return "нет данных"
+    return f"{uptime:.2f}% ({row['checks'] - row['failures']}/{row['checks']})"
+
+
+def _format_short_uptime(row: dict) -> str:
+    uptime = row.get("uptime_percent")
+    return f"{uptime:.2f}%" if uptime is not None else "—"
+
+
+@router.message(Command("uptime"))
+async def uptime_command_handler(message: Message, command: CommandObject) -> None:
+    """Доступность сайтов пользователя: по умолчанию за 24 часа, 7 и 30 дней,
+    с аргументами — для одного сайта и/или выбранного окна (см. UPTIME_USAGE)."""
+    try:
+        selector, window, start, end = _parse_uptime_args(command.args)
+        if window is None and start is None:
+            windows = [resolve_uptime_window(name) for name in UPTIME_WINDOWS]
+            title = f"Доступность ({' / '.join(UPTIME_WINDOWS)}):"
+        elif start is None:
+            window = window or "24h"
+            windows = [resolve_uptime_window(window)]
+            title = f"Доступность за {window}:"
+        else:
+            windows = [resolve_uptime_window(None, start, end)]
+            title = (
+                f"Доступность {windows[0][0]:%d.%m.%Y %H:%M} — "
+                f"{windows[0][1]:%d.%m.%Y %H:%M} UTC:"
+            )
+    except ValueError:
+        await message.answer(UPTIME_USAGE)
+        return
+    try:
+        # Один запрос на окно для всех сайтов пользователя; сайт из аргумента
+        # ищется среди них, так что чужой сайт не найдётся
+        by_window = []
+        for window_start, window_end in windows:
+            rows = await get_sites_uptime(
+                window_start, window_end, telegram_id=message.from_user.id
+            )
+            by_window.append({row["site_id"]: row for row in rows})
+        sites = list(by_window[0].values())
+        if not sites:
+            await message.answer("У вас пока нет сайтов для отслеживания.")
+            return
+        if selector is not None:
+            site = _match_site(sites, selector)
+            if site is None:
+                await message.answer(
+                    f"Сайт {html.escape(selector)} не найден среди ваших сайтов."
+                )
+                return
+            sites = [site]
+        lines = [title]
+        for site in sites[:_SITE_LINES_LIMIT]:
+            if len(by_window) == 1:
+                value = _format_uptime(site)
+            else:
+                value = " / ".join(
+                    _format_short_uptime(rows.get(site["site_id"], {}))
+                    for rows in by_window
+                )
+            lines.append(f"• {html.escape(site['url'])}: {value}")
+        if len(sites) > _SITE_LINES_LIMIT:
+            lines.append(f"… и ещё {len(sites) - _SITE_LINES_LIMIT}")
+        await message.answer("\n".join(lines))
+    except Exception as e:
+        logger.error(
+            f"Error in uptime command for {message.from_user.id}: {e}", exc_info=True
+        )
+        await handle_db_error(message, "uptime command")
+
+
 # @router.message(CommandStart())
 # async def command_start_handler(message: Message) -> None:
 #     raise Exception("Тестовая ошибка в command_start_handler")
@@ -239,7 +374,8 @@ async def add_site_callback(callback: CallbackQuery, state: FSMContext):
     """Начинает процесс добавления сайта."""
     await callback.message.edit_text(
         "Пожалуйста, отправьте URL сайта, который вы хотите отслеживать "
-        "(например, https://google.com):",
+        "(например, https://google.com).\nДля проверки только соединения "
+        "с сервисом — tcp://хост:порт или tls://хост:порт:",
         reply_markup=get_back_keyboard(),  # Добавляем кнопку "В начало"
     )
     await state.set_state(AddSite.waiting_for_url)
@@ -252,11 +388,15 @@ async def process_url(message: Message, state: FSMContext):
     url = message.text.strip().lower()  # Приводим к нижнему регистру для унификации
     await state.clear()
 
-    # Простая валидация URL
-    if not (url.startswith("http://") or url.startswith("https://")):
+    # Тип проверки определяется схемой: http(s) — HTTP, tcp/tls — соединение
+    try:
+        check_type = parse_site_url(url)
+    except ValueError as e:
+        logger.debug(f"Rejected site address from {message.from_user.id}: {e}")
         await message.answer(
-            "Неверный формат URL. Пожалуйста, отправьте URL, "
-            "начинающийся с http:// или https://.",
+            "Неверный формат адреса. Пожалуйста, отправьте URL, начинающийся "
+            "с http:// или https://, либо адрес сервиса вида tcp://хост:порт "
+            "или tls://хост:порт.",
             reply_markup=get_main_menu_keyboard(),
         )
         return
@@ -293,17 +433,21 @@ async def process_url(message: Message, state: FSMContext):
                 return
 
             # 3. Добавляем новый сайт
-            new_site = Site(url=url, user_id=user.id)
+            new_site = Site(url=url, user_id=user.id, check_type=check_type)
             session.add(new_site)
             await session.flush()  # Получаем ID нового сайта
             site_id = new_site.id
 
             # 4. Проверяем доступность и обновляем статус
-            is_available = await update_site_availability(session, site_id, url)
+            is_available = await update_site_availability(
+                session, site_id, probe_target(url, check_type), check_type
+            )
             status_text = "доступен" if is_available else "недоступен"
 
             # 5. Коммитим все изменения
             await session.commit()
+            await invalidate_user_sites(user.id)
+            await schedule_site_now(site_id)
 
             await message.answer(
                 f"Сайт {url} успешно добавлен! Текущий статус: {status_text}.",
@@ -317,6 +461,28 @@ async def process_url(message: Message, state: FSMContext):
         await handle_db_error(message, "adding site")
 
 
+_SITE_LINES_LIMIT = 30
+
+
+async def _format_latency_lines(sites) -> str:
+    """Время ответа сайтов (p50 / p95 / p99) для списка сайтов."""
+    # Сообщение Telegram ограничено 4096 символами: перцентили читаются
+    # только для показываемых сайтов
+    shown = sites[:_SITE_LINES_LIMIT]
+    try:
+        latencies = await get_latency_percentiles_async(site.id for site in shown)
+    except Exception as e:
+        logger.error(f"Failed to load latency percentiles: {e}", exc_info=True)
+        return ""
+    lines = [
+        f"• {html.escape(site.url)}: {format_percentiles(latencies.get(site.id))}"
+        for site in shown
+    ]
+    if len(sites) > _SITE_LINES_LIMIT:
+        lines.append(f"… и ещё {len(sites) - _SITE_LINES_LIMIT}")
+    return "\n\nВремя ответа p50 / p95 / p99, мс:\n" + "\n".join(lines)
+
+
 @router.callback_query(F.data == "list_sites")
 async def list_sites_callback(callback: CallbackQuery):
     """Показывает список сайтов пользователя."""
@@ -328,6 +494,8 @@ async def list_sites_callback(callback: CallbackQuery):
             if sites
             else "У вас пока нет сайтов для отслеживания."
         )
+        if sites:
+            text += await _format_latency_lines(sites)
 
         try:
             await callback.message.edit_text(text, reply_markup=keyboard)
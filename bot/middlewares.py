@@ -0,0 +1,28 @@
+# bot/middlewares.py
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from shared.metrics import BOT_HANDLER_DURATION
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Гистограмма времени хендлеров бота (метка — имя функции хендлера).
+
+    Регистрируется как внутренний middleware, поэтому видит выбранный
+    хендлер и не учитывает апдейты, которые ни один хендлер не обработал.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            BOT_HANDLER_DURATION.labels(name).observe(time.perf_counter() - started)
@@ -1,84 +1,384 @@
 # bot/monitoring.py
-from shared.models import Site, User
-from shared.utils import check_website_sync, send_notification_sync
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import List, Optional
+from shared.models import MonitoringCycle
+from shared.notifications import (
+    enqueue_digests,
+    flush_stale_digests,
+    flush_digest,
+    stage_digest_items,
+)
+from shared.monitoring import (
+    CheckEngine,
+    CheckResult,
+    probe_target,
+)
+from shared.http_client import run_in_process_loop
+from shared.latency import LatencyRecorder
+from shared.metrics import CYCLE_CHECKS_PER_SECOND, CYCLE_DURATION
+from shared.status_cache import cache_site_statuses
+from shared.site_state import (
+    NOTIFY_FLAPPING,
+    NOTIFY_SETTLED,
+    Decision,
+    SiteStateMachine,
+)
+from shared.scheduler import (
+    acquire_tick_lock,
+    claim_due_sites,
+    ensure_due_index,
+    release_tick_lock,
+)
 from shared.config import settings
 from shared.logger_setup import logger
 from bot.celery_app import celery_app
-from sqlalchemy import update, func
-from sqlalchemy.future import select
-from celery import shared_task
+from celery import shared_task, chord
 
 
-def check_single_site_sync(site: Site, user: User) -> bool:
-    logger.debug(f"Checking site: {site.url} for user: {user.telegram_id}")
-    is_available = check_website_sync(site.url)
-    from sqlalchemy.orm import Session
-    from shared.db import SyncSessionFactory
+def status_change_text(url: str, is_available: bool) -> str:
+    status_text = "доступен" if is_available else "недоступен"
+    status_tag = "✅" if is_available else "❌"
+    return f"{status_tag} Статус сайта <b>{url}</b> изменился: теперь <b>{status_text}</b>."
+
+
+def flapping_text(url: str) -> str:
+    return (
+        f"⚠️ Сайт <b>{url}</b> работает нестабильно: статус часто меняется. "
+        "Уведомления о каждой смене статуса приостановлены до стабилизации."
+    )
+
+
+def settled_text(url: str, is_available: bool) -> str:
+    status_text = "доступен" if is_available else "недоступен"
+    status_tag = "✅" if is_available else "❌"
+    return (
+        f"{status_tag} Статус сайта <b>{url}</b> стабилизировался: "
+        f"сейчас <b>{status_text}</b>."
+    )
+
+
+def notification_text(url: str, decision: Decision) -> str:
+    """Текст уведомления по решению автомата статусов."""
+    if decision.notify == NOTIFY_FLAPPING:
+        return flapping_text(url)
+    if decision.notify == NOTIFY_SETTLED:
+        return settled_text(url, decision.confirmed)
+    return status_change_text(url, decision.confirmed)
+
 
-    with SyncSessionFactory() as session:
-        session.execute(
-            update(Site)
-            .where(Site.id == site.id, Site.user_id == user.id)
-            .values(is_available=is_available, last_checked=func.now())
+def _empty_stats() -> dict:
+    return {"checked": 0, "up": 0, "down": 0, "errors": 0}
+
+
+async def _check_partition(
+    engine: CheckEngine,
+    rows: list,
+    carry: Optional[CheckResult],
+    stats: dict,
+    latencies: LatencyRecorder,
+    outbox: list,
+) -> Optional[CheckResult]:
+    """Проверяет пачку рабочего набора, сохраняет статусы и шлёт уведомления.
+
+    Строки отсортированы по URL; ``carry`` — результат последнего адреса
+    предыдущей пачки, чтобы адрес на стыке пачек не проверялся дважды.
+    Тексты уведомлений складываются в ``outbox`` парами (telegram_id, строка)
+    и отправляются дайджестами (см. ``check_sites_sync``).
+    Возвращает результат последнего URL этой пачки.
+    """
+    from shared.db import (
+        bulk_update_site_statuses_sync,
+        insert_site_checks_sync,
+        mark_sites_notified_sync,
+    )
+
+    # Сайты группируются по адресу проверки (URL и тип): каждый проверяется один раз
+    targets = defaultdict(list)
+    for row in rows:
+        targets[probe_target(row.url, row.check_type)].append(row)
+    checks = {carry.url: carry} if carry and carry.url in targets else {}
+    # В режиме transitions строка сайта пишется только при смене статуса,
+    # а время проверки уходит в Redis (cache_site_statuses)
+    persist_all = settings.status_persist_mode == "all"
+    urls = [url for url in targets if url not in checks]
+    check_types = [targets[url][0].check_type for url in urls]
+    for check in await engine.check_many(urls, check_types):
+        checks[check.url] = check
+    # Смена статуса подтверждается серией проверок, уведомления — с cooldown
+    machine = SiteStateMachine()
+    machine.load(row.site_id for row in rows)
+    now = datetime.now(timezone.utc)
+    statuses = []
+    cached = []
+    history = []
+    notifications = []
+    for target, check in checks.items():
+        # Результат одной проверки применяется ко всем подпискам на этот адрес
+        for row in targets[target]:
+            stats["checked"] += 1
+            stats["up" if check.is_available else "down"] += 1
+            if check.error:
+                stats["errors"] += 1
+            decision = machine.observe(
+                row.site_id, row.is_available, check.is_available, row.last_notified
+            )
+            if persist_all or decision.changed:
+                statuses.append((row.site_id, decision.confirmed))
+            if decision.notify:
+                notifications.append((row.site_id, row.url, row.telegram_id, decision))
+            cached.append(
+                {
+                    "id": row.site_id,
+                    "url": row.url,
+                    "user_id": row.user_id,
+                    "is_available": decision.confirmed,
+                    "last_checked": check.checked_at,
+                    "last_notified": now if decision.notify else row.last_notified,
+                    "check_interval_seconds": row.check_interval_seconds,
+                    "check_type": row.check_type,
+                }
+            )
+            if check.error is None:
+                latencies.record(row.site_id, check.latency_ms)
+            history.append(
+                (
+                    row.site_id,
+                    check.checked_at,
+                    check.is_available,
+                    check.status_code,
+                    check.latency_ms,
+                    check.error,
+                )
+            )
+    try:
+        if statuses:
+            bulk_update_site_statuses_sync(statuses)
+    except Exception as e:
+        # Без сохранённого статуса уведомления повторились бы в следующем цикле
+        stats["errors"] += len(statuses)
+        logger.error(f"Error saving {len(statuses)} check results: {e}", exc_info=True)
+        return checks.get(probe_target(rows[-1].url, rows[-1].check_type))
+    machine.save()
+    if notifications:
+        mark_sites_notified_sync([site_id for site_id, *_ in notifications])
+    try:
+        cache_site_statuses(cached)
+    except Exception as e:
+        logger.error(f"Error caching {len(cached)} site statuses: {e}", exc_info=True)
+    try:
+        insert_site_checks_sync(history)
+    except Exception as e:
+        # История вторична: её потеря не должна влиять на статусы и уведомления
+        logger.error(
+            f"Error saving {len(history)} check history rows: {e}", exc_info=True
         )
-        session.commit()
-    if site.is_available != is_available:
-        status_text = "доступен" if is_available else "недоступен"
-        status_tag = "✅" if is_available else "❌"
-        message = f"{status_tag} Статус сайта <b>{site.url}</b> изменился: теперь <b>{status_text}</b>."
-        send_notification_sync(user.telegram_id, message)
-    return is_available
-
-
-def check_all_sites_sync():
-    logger.debug("Starting check for all sites...")
-    from sqlalchemy.orm import Session
-    from shared.db import SyncSessionFactory
+    for _, url, telegram_id, decision in notifications:
+        outbox.append((telegram_id, notification_text(url, decision)))
+    return checks.get(probe_target(rows[-1].url, rows[-1].check_type))
+
+
+async def _check_work_set(
+    site_ids: Optional[List[int]], stats: dict, outbox: list
+) -> None:
+    from shared.db import stream_monitoring_work_set_sync
 
-    with SyncSessionFactory() as session:
-        stmt = select(User.telegram_id)
-        result = session.execute(stmt)
-        user_ids = [row for row in result.scalars().all()]
-    if not user_ids:
-        logger.info("No users found for monitoring")
+    carry = None
+    latencies = LatencyRecorder()
+    try:
+        async with CheckEngine() as engine:
+            # Чтение из БД блокирующее, но проверки пачки к этому моменту завершены,
+            # так что event loop простаивает только между пачками.
+            for rows in stream_monitoring_work_set_sync(site_ids):
+                carry = await _check_partition(
+                    engine, rows, carry, stats, latencies, outbox
+                )
+    finally:
+        try:
+            latencies.flush()
+        except Exception as e:
+            logger.error(f"Error flushing latency histograms: {e}", exc_info=True)
+
+
+def _dispatch_outbox(outbox: list, cycle_id: Optional[str]) -> None:
+    """Уведомления цикла копятся до его конца, иначе отправляются сразу."""
+    if not outbox:
         return
-    with SyncSessionFactory() as session:
-        for user_id in user_ids:
-            stmt = select(User).filter(User.telegram_id == user_id)
-            result = session.execute(stmt)
-            user = result.scalars().first()
-            if not user:
-                logger.warning(f"User {user_id} not found, skipping.")
-                continue
-            stmt = (
-                select(Site)
-                .join(User)
-                .filter(User.telegram_id == user_id)
-                .order_by(Site.id)
+    try:
+        if cycle_id:
+            stage_digest_items(cycle_id, outbox)
+        else:
+            enqueue_digests(outbox)
+    except Exception as e:
+        logger.error(f"Error queuing {len(outbox)} notifications: {e}", exc_info=True)
+
+
+def check_sites_sync(
+    site_ids: Optional[List[int]] = None, cycle_id: Optional[str] = None
+) -> dict:
+    """Проверяет сайты из ``site_ids`` (или все сайты) и возвращает счётчики.
+
+    Рабочий набор читается потоково пачками по ``CHECK_BATCH_SIZE`` строк,
+    поэтому потребление памяти не зависит от общего числа сайтов.
+    ``checked``/``up``/``down`` считаются по сайтам (подпискам), ``errors`` —
+    по сайтам, проверка которых завершилась сетевой ошибкой без HTTP-ответа,
+    либо результат которых не удалось сохранить.
+
+    Уведомления группируются по получателю: с ``cycle_id`` — до конца цикла
+    (дайджесты собирает ``aggregate_monitoring_cycle``), без него — в пределах
+    этого вызова.
+    """
+    stats = _empty_stats()
+    outbox = []
+    try:
+        run_in_process_loop(_check_work_set(site_ids, stats, outbox))
+    finally:
+        # Уже сохранённые смены статуса не должны остаться без уведомлений
+        _dispatch_outbox(outbox, cycle_id)
+    if not stats["checked"]:
+        logger.info("No sites found for monitoring")
+    else:
+        logger.info(f"Checked {stats['checked']} sites")
+    return stats
+
+
+@celery_app.task
+def check_sites_chunk(site_ids: List[int], cycle_id: Optional[str] = None) -> dict:
+    chunk_range = f"[{site_ids[0]}..{site_ids[-1]}]" if site_ids else "[]"
+    logger.debug(f"Checking {len(site_ids)} sites in chunk {chunk_range}")
+    try:
+        return check_sites_sync(site_ids, cycle_id)
+    except Exception as e:
+        # Ошибка одной порции не должна ронять весь chord
+        logger.error(f"Error checking site chunk {chunk_range}: {e}", exc_info=True)
+        stats = _empty_stats()
+        stats["errors"] = 1
+        return stats
+
+
+@celery_app.task
+def aggregate_monitoring_cycle(
+    chunk_results: List[dict], started_at: float, cycle_id: Optional[str] = None
+) -> dict:
+    """Сводит результаты подзадач, сохраняет итоги цикла и рассылает дайджесты."""
+    from shared.db import SyncSessionFactory
+
+    totals = _empty_stats()
+    for chunk in chunk_results:
+        for key in totals:
+            totals[key] += (chunk or {}).get(key, 0)
+    # Дайджесты — первыми: сбой записи итогов цикла не должен их задержать
+    if cycle_id:
+        try:
+            flush_digest(cycle_id)
+        except Exception as e:
+            logger.error(
+                f"Error sending digests for cycle {cycle_id}: {e}", exc_info=True
             )
-            result = session.execute(stmt)
-            sites = result.scalars().all()
-            for site in sites:
-                try:
-                    is_available = check_single_site_sync(site, user)
-                    logger.debug(
-                        f"Site {site.url} for user {user_id} is "
-                        f"{'available' if is_available else 'unavailable'}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Error checking site {site.url} for user {user_id}: {e}",
-                        exc_info=True,
-                    )
+    duration = time.time() - started_at
+    CYCLE_DURATION.observe(duration)
+    if duration > 0:
+        CYCLE_CHECKS_PER_SECOND.set(totals["checked"] / duration)
+    try:
+        with SyncSessionFactory() as session:
+            session.add(
+                MonitoringCycle(
+                    started_at=datetime.fromtimestamp(started_at, tz=timezone.utc),
+                    duration_seconds=duration,
+                    chunks=len(chunk_results),
+                    **totals,
+                )
+            )
+            session.commit()
+    except Exception as e:
+        logger.error(f"Error saving monitoring cycle summary: {e}", exc_info=True)
+    logger.info(
+        f"Monitoring cycle finished in {duration:.2f}s: {len(chunk_results)} chunks, "
+        f"checked={totals['checked']}, up={totals['up']}, down={totals['down']}, "
+        f"errors={totals['errors']}"
+    )
+    return {"duration_seconds": duration, "chunks": len(chunk_results), **totals}
+
+
+@celery_app.task
+def maintain_site_check_partitions() -> dict:
+    """Обслуживание истории: секции наперёд, удаление просроченных, прореживание.
+
+    Старые минутные и часовые агрегаты удаляются, суточные хранятся всегда.
+    """
+    from shared.db import (
+        drop_expired_site_check_partitions_sync,
+        ensure_site_check_partitions_sync,
+        prune_site_check_rollups_sync,
+    )
+
+    ensure_site_check_partitions_sync()
+    dropped = drop_expired_site_check_partitions_sync()
+    pruned = prune_site_check_rollups_sync()
+    return {"dropped": dropped, "pruned_rollups": pruned}
+
+
+@celery_app.task
+def rollup_site_checks() -> int:
+    """Сворачивает новые результаты проверок в агрегаты minute/hour/day."""
+    from shared.db import rollup_site_checks_sync
+
+    windows = rollup_site_checks_sync()
+    if windows:
+        logger.info(f"Site check rollup advanced by {windows} window(s)")
+    return windows
+
+
+def _get_default_interval_seconds(default_interval_minutes: Optional[int]) -> int:
+    if default_interval_minutes is None:
+        from shared.db import get_system_setting_sync
+
+        default_interval_minutes = (
+            get_system_setting_sync("check_interval_minutes")
+            or settings.check_interval_minutes
+        )
+    return int(default_interval_minutes) * 60
 
 
 @shared_task
 @celery_app.task
-def run_monitoring_check():
+def run_monitoring_check(default_interval_minutes: Optional[int] = None):
+    """Тик планировщика: отправляет на проверку только сайты, чей срок наступил.
+
+    Срок следующей проверки каждого сайта хранится в индексе Redis
+    (``shared.scheduler``); интервал — ``Site.check_interval_seconds``
+    или глобальный ``check_interval_minutes``.
+    """
     logger.info("Running scheduled monitoring check...")
+    if not acquire_tick_lock(celery_app.conf.task_time_limit):
+        logger.warning("Previous monitoring tick is still running, skipping")
+        return
     try:
-        check_all_sites_sync()
-        logger.info("Completed scheduled monitoring check")
+        started_at = time.time()
+        try:
+            flush_stale_digests(settings.digest_stale_seconds, started_at)
+        except Exception as e:
+            logger.error(f"Error flushing stale digests: {e}", exc_info=True)
+        ensure_due_index(started_at)
+        site_ids = claim_due_sites(
+            _get_default_interval_seconds(default_interval_minutes), started_at
+        )
+        if not site_ids:
+            logger.info("No sites are due for monitoring")
+            return
+        # Порции соседних id раздаются всем воркерам, итоги сводит callback chord
+        size = settings.monitoring_chunk_size
+        chunks = [site_ids[i : i + size] for i in range(0, len(site_ids), size)]
+        # Уведомления порций копятся под cycle_id и уходят дайджестом из callback
+        cycle_id = uuid.uuid4().hex
+        chord([check_sites_chunk.s(chunk, cycle_id) for chunk in chunks])(
+            aggregate_monitoring_cycle.s(started_at, cycle_id)
+        )
+        logger.info(f"Dispatched {len(site_ids)} due sites in {len(chunks)} chunks")
     except Exception as e:
         logger.error(f"Error in run_monitoring_check: {e}", exc_info=True)
         raise
+    finally:
+        release_tick_lock()
@@ -1,7 +1,7 @@
 # shared/config.py
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Literal
+from typing import Dict, Literal, Tuple
 from shared.logger_setup import logger
 import os
 from dotenv import load_dotenv
@@ -19,7 +19,102 @@ class Settings(BaseSettings):
     redis_host: str = Field("redis", env="REDIS_HOST")
     redis_port: int = Field(6379, env="REDIS_PORT")
     redis_db: int = 0
+    # Отдельная БД Redis для данных приложения (0 — брокер, 1 — результаты Celery)
+    redis_cache_db: int = Field(2, env="REDIS_CACHE_DB")
     check_interval_minutes: int = Field(5, env="CHECK_INTERVAL_MINUTES")
+    # Параметры асинхронного движка проверок
+    check_concurrency: int = Field(500, env="CHECK_CONCURRENCY")
+    check_timeout_seconds: float = Field(5.0, env="CHECK_TIMEOUT_SECONDS")
+    check_retries: int = Field(3, env="CHECK_RETRIES")
+    check_retry_delay_seconds: float = Field(2.0, env="CHECK_RETRY_DELAY_SECONDS")
+    check_retry_max_delay_seconds: float = Field(
+        30.0, env="CHECK_RETRY_MAX_DELAY_SECONDS"
+    )
+    # head — статус по HEAD (GET без чтения тела, если HEAD отклонён), get — всегда GET
+    check_probe_method: Literal["head", "get"] = Field("head", env="CHECK_PROBE_METHOD")
+    # Общие HTTP-клиенты процесса (shared/http_client.py)
+    http_pool_size: int = Field(500, env="HTTP_POOL_SIZE")
+    http_pool_per_host: int = Field(0, env="HTTP_POOL_PER_HOST")  # 0 — без лимита
+    http_keepalive_seconds: float = Field(30.0, env="HTTP_KEEPALIVE_SECONDS")
+    # HTTP/2 для проверок (нужен httpx[http2]): https-хосты, на которые в пачке
+    # приходится не меньше HTTP2_MIN_GROUP_SIZE адресов, проверяются через
+    # одно мультиплексированное соединение. Это меньше соединений с хостом, но не
+    # быстрее и дороже по CPU (замеры — в benchmarks/same_host.py)
+    http2_enabled: bool = Field(True, env="HTTP2_ENABLED")
+    http2_min_group_size: int = Field(4, env="HTTP2_MIN_GROUP_SIZE")
+    # Вежливость к проверяемым сайтам (shared/rate_limit.py): на регистрируемый
+    # домен не больше CHECK_DOMAIN_CONCURRENCY запросов сразу и не чаще
+    # CHECK_DOMAIN_RATE в секунду (запас CHECK_DOMAIN_BURST), 0 — без лимита.
+    # CHECK_DOMAIN_LIMITS — JSON с исключениями: {"example.com": [50, 100]}
+    check_domain_concurrency: int = Field(8, env="CHECK_DOMAIN_CONCURRENCY")
+    check_domain_rate: float = Field(10.0, env="CHECK_DOMAIN_RATE")
+    check_domain_burst: float = Field(20.0, env="CHECK_DOMAIN_BURST")
+    check_domain_limits: Dict[str, Tuple[int, float]] = Field(
+        {}, env="CHECK_DOMAIN_LIMITS"
+    )
+    # Кэш DNS для проверок (shared/dns_cache.py)
+    dns_default_ttl_seconds: float = Field(60.0, env="DNS_DEFAULT_TTL_SECONDS")
+    dns_min_ttl_seconds: float = Field(5.0, env="DNS_MIN_TTL_SECONDS")
+    dns_max_ttl_seconds: float = Field(3600.0, env="DNS_MAX_TTL_SECONDS")
+    dns_negative_ttl_seconds: float = Field(30.0, env="DNS_NEGATIVE_TTL_SECONDS")
+    dns_servfail_ttl_seconds: float = Field(5.0, env="DNS_SERVFAIL_TTL_SECONDS")
+    dns_cache_max_entries: int = Field(100000, env="DNS_CACHE_MAX_ENTRIES")
+    # Размер диапазона сайтов (по id) для одной подзадачи цикла мониторинга
+    monitoring_chunk_size: int = Field(500, env="MONITORING_CHUNK_SIZE")
+    # Число строк рабочего набора, которое читается из БД и проверяется за раз
+    check_batch_size: int = Field(5000, env="CHECK_BATCH_SIZE")
+    # Размер пачки при массовой записи результатов проверок в БД
+    db_write_batch_size: int = Field(1000, env="DB_WRITE_BATCH_SIZE")
+    # История проверок (site_checks): срок хранения и запас секций вперёд, в сутках
+    site_checks_retention_days: int = Field(30, env="SITE_CHECKS_RETENTION_DAYS")
+    site_checks_precreate_days: int = Field(3, env="SITE_CHECKS_PRECREATE_DAYS")
+    # Агрегаты истории (site_check_rollups): период задачи, задержка, чтобы
+    # дождаться записи запоздавших результатов, и сроки хранения минут/часов
+    rollup_interval_seconds: int = Field(60, env="ROLLUP_INTERVAL_SECONDS")
+    rollup_lag_seconds: int = Field(300, env="ROLLUP_LAG_SECONDS")
+    rollup_minute_retention_days: int = Field(7, env="ROLLUP_MINUTE_RETENTION_DAYS")
+    rollup_hour_retention_days: int = Field(90, env="ROLLUP_HOUR_RETENTION_DAYS")
+    # Кэш текущих статусов сайтов в Redis (shared/status_cache.py)
+    status_cache_ttl_seconds: int = Field(3600, env="STATUS_CACHE_TTL_SECONDS")
+    # Окно, за которое считаются перцентили времени ответа (shared/latency.py)
+    latency_window_hours: int = Field(24, env="LATENCY_WINDOW_HOURS")
+    # Запись статусов в sites: transitions — только смены статуса (last_checked
+    # хранится в Redis), all — каждая проверка обновляет строку сайта
+    status_persist_mode: Literal["transitions", "all"] = Field(
+        "transitions", env="STATUS_PERSIST_MODE"
+    )
+    # Автомат статусов (shared/site_state.py): сколько проверок подряд
+    # подтверждают смену статуса, детектор «мигания» и cooldown уведомлений
+    status_down_threshold: int = Field(2, env="STATUS_DOWN_THRESHOLD")
+    status_up_threshold: int = Field(1, env="STATUS_UP_THRESHOLD")
+    flap_window_seconds: int = Field(3600, env="FLAP_WINDOW_SECONDS")
+    flap_threshold: int = Field(5, env="FLAP_THRESHOLD")
+    flap_settle_checks: int = Field(3, env="FLAP_SETTLE_CHECKS")
+    notification_cooldown_seconds: int = Field(900, env="NOTIFICATION_COOLDOWN_SECONDS")
+    # Планировщик по времени следующей проверки: шаг тика и период пересинхронизации
+    scheduler_tick_seconds: int = Field(30, env="SCHEDULER_TICK_SECONDS")
+    scheduler_resync_seconds: int = Field(300, env="SCHEDULER_RESYNC_SECONDS")
+    # Очередь уведомлений: лимиты Telegram (глобальный и на один чат) и повторы
+    telegram_global_rate_per_second: float = Field(
+        25.0, env="TELEGRAM_GLOBAL_RATE_PER_SECOND"
+    )
+    telegram_chat_rate_per_second: float = Field(
+        1.0, env="TELEGRAM_CHAT_RATE_PER_SECOND"
+    )
+    notification_concurrency: int = Field(10, env="NOTIFICATION_CONCURRENCY")
+    notification_max_attempts: int = Field(5, env="NOTIFICATION_MAX_ATTEMPTS")
+    # Через сколько секунд дайджест цикла, чей chord не завершился, уходит из тика
+    digest_stale_seconds: int = Field(1800, env="DIGEST_STALE_SECONDS")
+    # Метрики Prometheus (shared/metrics.py): порты экспортёров воркера и бота,
+    # 0 — экспортёр выключен. Веб отдаёт метрики на /metrics, только если
+    # включён WEB_METRICS_ENABLED: по токену METRICS_TOKEN (Bearer) или,
+    # без токена, администратору после входа
+    worker_metrics_port: int = Field(9100, env="WORKER_METRICS_PORT")
+    bot_metrics_port: int = Field(9101, env="BOT_METRICS_PORT")
+    web_metrics_enabled: bool = Field(False, env="WEB_METRICS_ENABLED")
+    metrics_token: str = Field("", env="METRICS_TOKEN")
+    # Воркер Celery (пул prefork): число процессов, 0 — по числу ядер
+    worker_concurrency: int = Field(0, env="WORKER_CONCURRENCY")
     admin_username: str = Field("admin", env="ADMIN_USERNAME")
     admin_password: str = Field("strongpassword", env="ADMIN_PASSWORD")
     admin_chat_id: int = Field(..., env="ADMIN_CHAT_ID")  # Добавлено
@@ -1,14 +1,43 @@
 # shared/db.py
-from typing import List, Optional, Callable, TypeVar, Coroutine
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+from typing import (
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Callable,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Coroutine,
+    Any,
+)
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy import create_engine, update, func
+from sqlalchemy import (
+    Boolean,
+    Integer,
+    column,
+    create_engine,
+    update,
+    func,
+    text,
+    values,
+)
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
-from psycopg2.errors import UndefinedTable  # Импортируем для обработки ошибки
-from shared.models import Base, User, Site, SystemSettings
+from psycopg2.errors import CheckViolation, UndefinedTable
+from shared.models import Base, User, Site, SiteCheck, SiteCheckRollup, SystemSettings
+from shared import status_cache
+from shared.scheduler import schedule_site_now
+from shared.schemas import Site as SiteSchema
 from shared.config import settings
 from shared.logger_setup import logger
+from shared.metrics import instrument_engine
+from shared.monitoring import validate_check_type
 
 logger.info("Creating async database engine...")
 async_engine = create_async_engine(settings.database_url_async, echo=False)
@@ -25,6 +54,57 @@ sync_engine = create_engine(
 )
 SyncSessionFactory = sessionmaker(bind=sync_engine, expire_on_commit=False)
 logger.info("Sync database engine and session factory created.")
+instrument_engine(async_engine.sync_engine)
+instrument_engine(sync_engine)
+
+
+def reset_after_fork() -> None:
+    """Забывает пулы соединений, унаследованные дочерним процессом воркера.
+
+    ``close=False`` не трогает сокеты родителя: дочерний процесс откроет
+    собственные соединения при первом запросе.
+    """
+    sync_engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
+# create_all не добавляет новые колонки в существующие таблицы,
+# поэтому они дописываются идемпотентными ALTER TABLE.
+SCHEMA_UPDATES = [
+    "ALTER TABLE sites ADD COLUMN IF NOT EXISTS check_interval_seconds INTEGER",
+    "ALTER TABLE sites "
+    "ADD COLUMN IF NOT EXISTS check_type VARCHAR(8) NOT NULL DEFAULT 'http'",
+    "ALTER TABLE site_check_rollups "
+    "ADD COLUMN IF NOT EXISTS cum_checks BIGINT NOT NULL DEFAULT 0",
+    "ALTER TABLE site_check_rollups "
+    "ADD COLUMN IF NOT EXISTS cum_failures BIGINT NOT NULL DEFAULT 0",
+]
+
+
+SITE_CHECK_PARTITION_PREFIX = "site_checks_p"
+SITE_CHECK_COLUMNS = (
+    "site_id",
+    "checked_at",
+    "is_available",
+    "status_code",
+    "latency_ms",
+    "error",
+)
+
+
+def _site_check_partition_statements(days_ahead: int) -> List[str]:
+    """DDL суточных секций site_checks со вчерашнего дня на ``days_ahead`` вперёд."""
+    today = datetime.now(timezone.utc).date()
+    statements = []
+    for offset in range(-1, days_ahead + 1):
+        day = today + timedelta(days=offset)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {SITE_CHECK_PARTITION_PREFIX}{day:%Y%m%d} "
+            f"PARTITION OF site_checks FOR VALUES "
+            f"FROM ('{day.isoformat()} 00:00:00+00') "
+            f"TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+        )
+    return statements
 
 
 async def init_db():
@@ -33,6 +113,12 @@ async def init_db():
         async with async_engine.begin() as conn:
             logger.info("Initializing database schema...")
             await conn.run_sync(Base.metadata.create_all)  # Create tables
+            for statement in SCHEMA_UPDATES:
+                await conn.execute(text(statement))
+            for statement in _site_check_partition_statements(
+                settings.site_checks_precreate_days
+            ):
+                await conn.execute(text(statement))
             logger.info("Database schema initialized.")
         # Initialize default settings
         async with AsyncSessionFactory() as session:
@@ -142,9 +228,16 @@ async def _get_user_sites(session: AsyncSession, telegram_id: int) -> List[Site]
     return result.scalars().all()
 
 
+async def _get_user_id(session: AsyncSession, telegram_id: int) -> Optional[int]:
+    result = await session.execute(
+        select(User.id).filter(User.telegram_id == telegram_id)
+    )
+    return result.scalar()
+
+
 async def _delete_site_by_id(
     session: AsyncSession, site_id: int, telegram_id: int
-) -> bool:
+) -> Optional[int]:
     stmt = (
         select(Site)
         .join(User)
@@ -155,11 +248,11 @@ async def _delete_site_by_id(
     if site_to_delete:
         logger.info(f"Deleting site {site_id} for user {telegram_id}")
         await session.delete(site_to_delete)
-        return True
+        return site_to_delete.user_id
     logger.warning(
         f"Attempted to delete non-existent site {site_id} for user {telegram_id}"
     )
-    return False
+    return None
 
 
 async def _get_all_users_admin(session: AsyncSession) -> List[dict]:
@@ -211,6 +304,41 @@ async def _delete_site_admin(session: AsyncSession, site_id: int) -> Optional[in
     return None
 
 
+async def _set_site_check_interval_admin(
+    session: AsyncSession, site_id: int, check_interval_seconds: Optional[int]
+) -> Optional[int]:
+    """Задаёт индивидуальный интервал проверки сайта; возвращает user_id сайта."""
+    site = await session.get(Site, site_id)
+    if not site:
+        logger.warning(
+            f"Admin attempted to set interval for non-existent site {site_id}"
+        )
+        return None
+    logger.info(
+        f"Admin setting check interval for site {site_id} to {check_interval_seconds}"
+    )
+    site.check_interval_seconds = check_interval_seconds
+    await session.flush()
+    return site.user_id
+
+
+async def _set_site_check_type_admin(
+    session: AsyncSession, site_id: int, check_type: str
+) -> Optional[int]:
+    """Меняет тип проверки сайта; возвращает user_id сайта."""
+    site = await session.get(Site, site_id)
+    if not site:
+        logger.warning(
+            f"Admin attempted to set check type for non-existent site {site_id}"
+        )
+        return None
+    validate_check_type(site.url, check_type)
+    logger.info(f"Admin setting check type for site {site_id} to {check_type}")
+    site.check_type = check_type
+    await session.flush()
+    return site.user_id
+
+
 async def _get_user_by_id_admin(session: AsyncSession, user_id: int) -> Optional[User]:
     stmt = select(User).filter(User.id == user_id)
     result = await session.execute(stmt)
@@ -271,6 +399,472 @@ async def _update_site_status(
         raise
 
 
+def stream_monitoring_work_set_sync(
+    site_ids: Optional[List[int]] = None, batch_size: Optional[int] = None
+) -> Iterator[Sequence[Row]]:
+    """Потоково отдаёт рабочий набор цикла пачками строк.
+
+    Один запрос с серверным курсором (``yield_per``) и проекцией только нужных
+    колонок: ``site_id``, ``url``, ``is_available``, ``telegram_id``,
+    ``check_type`` и поля для кэша статусов (``user_id``, ``last_notified``,
+    ``check_interval_seconds``). Строки
+    упорядочены по URL, поэтому подписки на один адрес идут подряд.
+    """
+    batch_size = batch_size or settings.check_batch_size
+    stmt = (
+        select(
+            Site.id.label("site_id"),
+            Site.url,
+            Site.is_available,
+            User.telegram_id,
+            Site.user_id,
+            Site.last_notified,
+            Site.check_interval_seconds,
+            Site.check_type,
+        )
+        .join(User, Site.user_id == User.id)
+        .order_by(Site.url, Site.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if site_ids is not None:
+        stmt = stmt.filter(Site.id.in_(site_ids))
+    with SyncSessionFactory() as session:
+        result = session.execute(stmt)
+        for partition in result.partitions():
+            yield partition
+
+
+def bulk_update_site_statuses_sync(
+    statuses: Iterable[Tuple[int, bool]], batch_size: Optional[int] = None
+) -> int:
+    """Записывает результаты проверок пачками: один UPDATE ... FROM (VALUES ...) на пачку.
+
+    ``statuses`` — пары (site_id, is_available). Каждая пачка фиксируется
+    отдельной транзакцией, чтобы не держать долгих блокировок строк.
+    Возвращает число обновлённых строк.
+    """
+    batch_size = batch_size or settings.db_write_batch_size
+    statuses = list(statuses)
+    updated = 0
+    with SyncSessionFactory() as session:
+        for start in range(0, len(statuses), batch_size):
+            batch = statuses[start : start + batch_size]
+            rows = values(
+                column("id", Integer), column("is_available", Boolean), name="v"
+            ).data(batch)
+            result = session.execute(
+                update(Site)
+                .where(Site.id == rows.c.id)
+                .values(is_available=rows.c.is_available, last_checked=func.now())
+            )
+            session.commit()
+            updated += result.rowcount
+    logger.debug(f"Bulk-updated {updated} site statuses in batches of {batch_size}")
+    return updated
+
+
+def ensure_site_check_partitions_sync(days_ahead: Optional[int] = None) -> None:
+    """Создаёт недостающие суточные секции site_checks (идемпотентно)."""
+    days_ahead = (
+        settings.site_checks_precreate_days if days_ahead is None else days_ahead
+    )
+    with sync_engine.begin() as conn:
+        for statement in _site_check_partition_statements(days_ahead):
+            conn.execute(text(statement))
+
+
+def drop_expired_site_check_partitions_sync(
+    retention_days: Optional[int] = None,
+) -> List[str]:
+    """Удаляет секции site_checks старше срока хранения и возвращает их имена.
+
+    Секция удаляется целиком (``DROP TABLE``): это O(1) и не оставляет
+    мёртвых строк, в отличие от ``DELETE`` по дате.
+    """
+    retention_days = retention_days or settings.site_checks_retention_days
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=retention_days)
+    dropped = []
+    with sync_engine.begin() as conn:
+        partitions = conn.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = 'site_checks'"
+            )
+        ).scalars()
+        for name in partitions:
+            suffix = name[len(SITE_CHECK_PARTITION_PREFIX) :]
+            try:
+                day = datetime.strptime(suffix, "%Y%m%d").date()
+            except ValueError:
+                continue  # Чужая секция — не трогаем
+            if day < cutoff:
+                conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                dropped.append(name)
+    if dropped:
+        logger.info(f"Dropped {len(dropped)} expired site_checks partitions")
+    return dropped
+
+
+def _copy_site_checks(rows: List[Tuple[Any, ...]]) -> None:
+    buffer = io.StringIO()
+    # В CSV-формате COPY пустое поле без кавычек — NULL
+    csv.writer(buffer).writerows(
+        (
+            site_id,
+            checked_at.isoformat(),
+            "t" if is_available else "f",
+            status_code,
+            latency_ms,
+            error,
+        )
+        for site_id, checked_at, is_available, status_code, latency_ms, error in rows
+    )
+    buffer.seek(0)
+    conn = sync_engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY site_checks ({', '.join(SITE_CHECK_COLUMNS)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _insert_site_checks(rows: List[Tuple[Any, ...]]) -> None:
+    # Многострочный INSERT (insertmanyvalues в SQLAlchemy 2.0)
+    with SyncSessionFactory() as session:
+        session.execute(
+            SiteCheck.__table__.insert(),
+            [dict(zip(SITE_CHECK_COLUMNS, row)) for row in rows],
+        )
+        session.commit()
+
+
+def insert_site_checks_sync(rows: Iterable[Tuple[Any, ...]]) -> int:
+    """Пишет пачку результатов в историю проверок одним ``COPY``.
+
+    ``rows`` — кортежи в порядке ``SITE_CHECK_COLUMNS``. Если драйвер не
+    поддерживает COPY, используется многострочный INSERT. Если для
+    ``checked_at`` ещё нет секции, секции создаются и запись повторяется.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    write = (
+        _copy_site_checks
+        if sync_engine.dialect.driver == "psycopg2"
+        else _insert_site_checks
+    )
+    try:
+        write(rows)
+    except Exception as e:
+        # Через SQLAlchemy ошибка драйвера приходит обёрнутой (e.orig)
+        if not isinstance(getattr(e, "orig", e), CheckViolation):
+            raise
+        logger.warning("No site_checks partition for some rows, creating partitions")
+        ensure_site_check_partitions_sync()
+        write(rows)
+    logger.debug(f"Inserted {len(rows)} rows into site_checks")
+    return len(rows)
+
+
+ROLLUP_WATERMARK_KEY = "site_checks_rollup_watermark"
+ROLLUP_METRICS = (
+    "checks",
+    "failures",
+    "latency_count",
+    "latency_sum_ms",
+    "latency_le_100",
+    "latency_le_300",
+    "latency_le_1000",
+    "latency_le_3000",
+    "latency_gt_3000",
+)
+# Исходное разрешение для каждого уровня прореживания
+_ROLLUP_SOURCES = (("hour", "minute"), ("day", "hour"))
+_ROLLUP_MAX_WINDOW = timedelta(hours=6)  # Догоняем отставание порциями
+_ROLLUP_LOCK_ID = 73100013  # pg_try_advisory_xact_lock: один rollup за раз
+
+_ROLLUP_UPSERT = (
+    f"INSERT INTO site_check_rollups (site_id, resolution, bucket_start, "
+    f"{', '.join(ROLLUP_METRICS)}) {{select}} "
+    f"ON CONFLICT (site_id, resolution, bucket_start) DO UPDATE SET "
+    + ", ".join(f"{name} = EXCLUDED.{name}" for name in ROLLUP_METRICS)
+)
+_ROLLUP_FROM_RAW = _ROLLUP_UPSERT.format(select="""
+    SELECT site_id, 'minute', date_trunc('minute', checked_at, 'UTC'),
+        count(*),
+        count(*) FILTER (WHERE NOT is_available),
+        count(latency_ms) FILTER (WHERE error IS NULL),
+        coalesce(sum(latency_ms) FILTER (WHERE error IS NULL), 0),
+        count(*) FILTER (WHERE error IS NULL AND latency_ms <= 100),
+        count(*) FILTER (WHERE error IS NULL AND latency_ms > 100 AND latency_ms <= 300),
+        count(*) FILTER (WHERE error IS NULL AND latency_ms > 300 AND latency_ms <= 1000),
+        count(*) FILTER (WHERE error IS NULL AND latency_ms > 1000 AND latency_ms <= 3000),
+        count(*) FILTER (WHERE error IS NULL AND latency_ms > 3000)
+    FROM site_checks
+    WHERE checked_at >= :start AND checked_at < :end
+    GROUP BY 1, 3
+    """)
+
+
+def _rollup_downsample_sql(resolution: str, source: str) -> str:
+    return _ROLLUP_UPSERT.format(select=f"""
+        SELECT site_id, '{resolution}', date_trunc('{resolution}', bucket_start, 'UTC'),
+            {', '.join(f'sum({name})' for name in ROLLUP_METRICS)}
+        FROM site_check_rollups
+        WHERE resolution = '{source}' AND bucket_start >= :start AND bucket_start < :end
+        GROUP BY 1, 3
+        """)
+
+
+# Пересчёт нарастающих итогов часовых агрегатов начиная с :start
+_ROLLUP_CUMULATIVE = """
+WITH touched AS (
+    SELECT DISTINCT site_id FROM site_check_rollups
+    WHERE resolution = 'hour' AND bucket_start >= :start
+), base AS (
+    SELECT t.site_id,
+        coalesce(p.cum_checks, 0) AS cum_checks,
+        coalesce(p.cum_failures, 0) AS cum_failures
+    FROM touched t
+    LEFT JOIN LATERAL (
+        SELECT cum_checks, cum_failures FROM site_check_rollups p
+        WHERE p.site_id = t.site_id AND p.resolution = 'hour'
+            AND p.bucket_start < :start
+        ORDER BY p.bucket_start DESC LIMIT 1
+    ) p ON true
+), running AS (
+    SELECT r.site_id, r.bucket_start,
+        b.cum_checks + sum(r.checks) OVER w AS cum_checks,
+        b.cum_failures + sum(r.failures) OVER w AS cum_failures
+    FROM site_check_rollups r JOIN base b ON b.site_id = r.site_id
+    WHERE r.resolution = 'hour' AND r.bucket_start >= :start
+    WINDOW w AS (PARTITION BY r.site_id ORDER BY r.bucket_start)
+)
+UPDATE site_check_rollups t
+SET cum_checks = running.cum_checks, cum_failures = running.cum_failures
+FROM running
+WHERE t.site_id = running.site_id AND t.resolution = 'hour'
+    AND t.bucket_start = running.bucket_start
+"""
+
+
+def _floor_to(moment: datetime, resolution: str) -> datetime:
+    moment = moment.astimezone(timezone.utc).replace(second=0, microsecond=0)
+    if resolution in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if resolution == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def rollup_site_checks_sync(now: Optional[datetime] = None) -> int:
+    """Дописывает агрегаты site_check_rollups от водяной метки до ``now - lag``.
+
+    Каждое окно пересчитывает затронутые интервалы целиком и заменяет строки
+    (``ON CONFLICT DO UPDATE SET x = EXCLUDED.x``), поэтому повторный прогон
+    того же окна ничего не портит. Метка (unix-время в ``system_settings``)
+    сдвигается в той же транзакции, что и запись агрегатов, так что прерванный
+    прогон продолжится с места остановки. Возвращает число обработанных окон.
+    """
+    now = now or datetime.now(timezone.utc)
+    upper = _floor_to(now - timedelta(seconds=settings.rollup_lag_seconds), "minute")
+    windows = 0
+    while True:
+        with sync_engine.begin() as conn:
+            locked = conn.execute(
+                text("SELECT pg_try_advisory_xact_lock(:lock_id)"),
+                {"lock_id": _ROLLUP_LOCK_ID},
+            ).scalar()
+            if not locked:
+                logger.info("Another rollup is in progress, skipping")
+                return windows
+            watermark = conn.execute(
+                select(SystemSettings.value).filter(
+                    SystemSettings.key == ROLLUP_WATERMARK_KEY
+                )
+            ).scalar()
+            if watermark is not None:
+                start = datetime.fromtimestamp(int(watermark), tz=timezone.utc)
+            else:
+                # Первый запуск: начинаем с самой старой сохранённой проверки
+                oldest = conn.execute(select(func.min(SiteCheck.checked_at))).scalar()
+                if oldest is None:
+                    return windows
+                start = _floor_to(oldest, "minute")
+            if start >= upper:
+                return windows
+            end = min(upper, start + _ROLLUP_MAX_WINDOW)
+            conn.execute(text(_ROLLUP_FROM_RAW), {"start": start, "end": end})
+            for resolution, source in _ROLLUP_SOURCES:
+                conn.execute(
+                    text(_rollup_downsample_sql(resolution, source)),
+                    {"start": _floor_to(start, resolution), "end": end},
+                )
+            conn.execute(text(_ROLLUP_CUMULATIVE), {"start": _floor_to(start, "hour")})
+            conn.execute(
+                text(
+                    "INSERT INTO system_settings (key, value) VALUES (:key, :value) "
+                    "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value"
+                ),
+                {"key": ROLLUP_WATERMARK_KEY, "value": str(int(end.timestamp()))},
+            )
+        windows += 1
+        logger.debug(f"Rolled up site checks for [{start}, {end})")
+
+
+def _cumulative_at(alias: str, bound: str) -> str:
+    """LATERAL с нарастающими итогами сайта на момент ``:bound``.
+
+    Берётся последний час до ``bound``; если он уже удалён по сроку хранения,
+    — первый сохранённый час за вычетом его собственных значений.
+    """
+    return f"""
+    LEFT JOIN LATERAL (
+        SELECT c.cum_checks, c.cum_failures FROM (
+            (SELECT cum_checks, cum_failures, 0 AS rank FROM site_check_rollups r
+             WHERE r.site_id = s.id AND r.resolution = 'hour' AND r.bucket_start < :{bound}
+             ORDER BY r.bucket_start DESC LIMIT 1)
+            UNION ALL
+            (SELECT cum_checks - checks, cum_failures - failures, 1 FROM site_check_rollups r
+             WHERE r.site_id = s.id AND r.resolution = 'hour' AND r.bucket_start >= :{bound}
+             ORDER BY r.bucket_start LIMIT 1)
+        ) c ORDER BY c.rank LIMIT 1
+    ) {alias} ON true
+    """
+
+
+_UPTIME_SQL = f"""
+SELECT s.id AS site_id, s.url,
+    coalesce(e.cum_checks, 0) - coalesce(b.cum_checks, 0) AS checks,
+    coalesce(e.cum_failures, 0) - coalesce(b.cum_failures, 0) AS failures
+FROM sites s
+{_cumulative_at("b", "start")}
+{_cumulative_at("e", "end")}
+WHERE {{where}}
+ORDER BY s.id
+"""
+
+
+UPTIME_WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+
+
+def resolve_uptime_window(
+    window: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Tuple[datetime, datetime]:
+    """Границы окна: именованное (``24h``/``7d``/``30d``) или произвольное.
+
+    ``end`` по умолчанию — сейчас; ``start`` обязателен, если не задан ``window``.
+    """
+    end = end or datetime.now(timezone.utc)
+    if start is None:
+        if window not in UPTIME_WINDOWS:
+            raise ValueError(
+                f"Unknown window {window!r}, expected one of {', '.join(UPTIME_WINDOWS)}"
+            )
+        start = end - UPTIME_WINDOWS[window]
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise ValueError("Window start must be before its end")
+    return start, end
+
+
+async def _get_sites_uptime(
+    session: AsyncSession,
+    start: datetime,
+    end: datetime,
+    site_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    telegram_id: Optional[int] = None,
+) -> List[dict]:
+    """Доступность сайтов за ``[start, end)`` по часовым нарастающим итогам.
+
+    На сайт — два индексных поиска по первичному ключу site_check_rollups,
+    независимо от длины окна, и один запрос на все сайты пользователя.
+    Начало окна округляется вниз до часа.
+    """
+    if site_id is not None:
+        where, params = "s.id = :site_id", {"site_id": site_id}
+    elif user_id is not None:
+        where, params = "s.user_id = :user_id", {"user_id": user_id}
+    else:
+        where = "s.user_id = (SELECT id FROM users WHERE telegram_id = :telegram_id)"
+        params = {"telegram_id": telegram_id}
+    start = _floor_to(start, "hour")
+    result = await session.execute(
+        text(_UPTIME_SQL.format(where=where)), {"start": start, "end": end, **params}
+    )
+    return [
+        {
+            "site_id": row.site_id,
+            "url": row.url,
+            "start": start,
+            "end": end,
+            "checks": row.checks,
+            "failures": row.failures,
+            "uptime_percent": (
+                100.0 * (row.checks - row.failures) / row.checks if row.checks else None
+            ),
+        }
+        for row in result
+    ]
+
+
+def prune_site_check_rollups_sync() -> int:
+    """Удаляет минутные и часовые агрегаты старше их сроков хранения."""
+    now = datetime.now(timezone.utc)
+    deleted = 0
+    with sync_engine.begin() as conn:
+        for resolution, days in (
+            ("minute", settings.rollup_minute_retention_days),
+            ("hour", settings.rollup_hour_retention_days),
+        ):
+            result = conn.execute(
+                SiteCheckRollup.__table__.delete().where(
+                    SiteCheckRollup.resolution == resolution,
+                    SiteCheckRollup.bucket_start < now - timedelta(days=days),
+                )
+            )
+            deleted += result.rowcount
+    if deleted:
+        logger.info(f"Pruned {deleted} expired site check rollups")
+    return deleted
+
+
+def mark_sites_notified_sync(
+    site_ids: Iterable[int], batch_size: Optional[int] = None
+) -> None:
+    """Проставляет ``last_notified = now()`` пачками (для cooldown уведомлений)."""
+    batch_size = batch_size or settings.db_write_batch_size
+    site_ids = list(site_ids)
+    with SyncSessionFactory() as session:
+        for start in range(0, len(site_ids), batch_size):
+            session.execute(
+                update(Site)
+                .where(Site.id.in_(site_ids[start : start + batch_size]))
+                .values(last_notified=func.now())
+            )
+            session.commit()
+
+
 def get_system_setting_sync(key: str) -> Optional[int]:
     """Synchronously fetches a system setting by key."""
     try:
@@ -327,32 +921,100 @@ async def _set_system_setting(session: AsyncSession, key: str, value: int) -> No
         raise
 
 
+async def get_sites_uptime(
+    start: datetime,
+    end: datetime,
+    site_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    telegram_id: Optional[int] = None,
+) -> List[dict]:
+    return await run_async_db_operation(
+        _get_sites_uptime, start, end, site_id, user_id, telegram_id
+    )
+
+
 async def get_or_create_user(telegram_id: int, username: Optional[str]) -> User:
     return await run_async_db_operation(_get_or_create_user, telegram_id, username)
 
 
 async def add_site_to_user(telegram_id: int, url: str) -> Optional[Site]:
-    return await run_async_db_operation(_add_site_to_user, telegram_id, url)
+    site = await run_async_db_operation(_add_site_to_user, telegram_id, url)
+    if site:
+        await status_cache.invalidate_user_sites(site.user_id)
+        await schedule_site_now(site.id)
+    return site
+
 
+async def _load_user_sites(
+    user_id: Optional[int], telegram_id: Optional[int] = None
+) -> List[SiteSchema]:
+    """Сайты пользователя из кэша Redis, при промахе — из Postgres с записью в кэш."""
+    try:
+        if user_id is None:
+            user_id = await status_cache.get_cached_user_id(telegram_id)
+        if user_id is not None:
+            cached = await status_cache.get_cached_user_sites(user_id)
+            if cached is not None:
+                return cached
+    except Exception as e:
+        logger.error(f"Status cache read failed, using database: {e}")
+    if user_id is None:
+        user_id = await run_async_db_operation(_get_user_id, telegram_id)
+        if user_id is None:
+            return []
+    sites = await run_async_db_operation(_get_user_sites_admin, user_id)
+    try:
+        return await status_cache.cache_user_sites(user_id, sites, telegram_id)
+    except Exception as e:
+        logger.error(f"Status cache write failed: {e}")
+        return [SiteSchema.model_validate(site) for site in sites]
 
-async def get_user_sites(telegram_id: int) -> List[Site]:
-    return await run_async_db_operation(_get_user_sites, telegram_id)
+
+async def get_user_sites(telegram_id: int) -> List[SiteSchema]:
+    return await _load_user_sites(None, telegram_id)
 
 
 async def delete_site_by_id(site_id: int, telegram_id: int) -> bool:
-    return await run_async_db_operation(_delete_site_by_id, site_id, telegram_id)
+    user_id = await run_async_db_operation(_delete_site_by_id, site_id, telegram_id)
+    if user_id is None:
+        return False
+    await status_cache.forget_site(user_id, site_id)
+    return True
 
 
 async def get_all_users_admin() -> List[dict]:
     return await run_async_db_operation(_get_all_users_admin)
 
 
-async def get_user_sites_admin(user_id: int) -> List[Site]:
-    return await run_async_db_operation(_get_user_sites_admin, user_id)
+async def get_user_sites_admin(user_id: int) -> List[SiteSchema]:
+    return await _load_user_sites(user_id)
 
 
 async def delete_site_admin(site_id: int) -> Optional[int]:
-    return await run_async_db_operation(_delete_site_admin, site_id)
+    user_id = await run_async_db_operation(_delete_site_admin, site_id)
+    if user_id is not None:
+        await status_cache.forget_site(user_id, site_id)
+    return user_id
+
+
+async def set_site_check_interval_admin(
+    site_id: int, check_interval_seconds: Optional[int]
+) -> Optional[int]:
+    user_id = await run_async_db_operation(
+        _set_site_check_interval_admin, site_id, check_interval_seconds
+    )
+    if user_id is not None:
+        await status_cache.invalidate_user_sites(user_id, site_id)
+    return user_id
+
+
+async def set_site_check_type_admin(site_id: int, check_type: str) -> Optional[int]:
+    user_id = await run_async_db_operation(
+        _set_site_check_type_admin, site_id, check_type
+    )
+    if user_id is not None:
+        await status_cache.invalidate_user_sites(user_id, site_id)
+    return user_id
 
 
 async def get_user_by_id_admin(user_id: int) -> Optional[User]:
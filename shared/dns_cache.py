@@ -0,0 +1,257 @@
+# shared/dns_cache.py
+import asyncio
+import math
+import socket
+import time
+from aiohttp.abc import AbstractResolver
+from typing import Dict, List, Optional, Tuple
+from shared.config import settings
+from shared.logger_setup import logger
+
+try:  # aiodns отдаёт TTL записей; без него используется TTL по умолчанию
+    import aiodns
+except ImportError:  # pragma: no cover - зависит от окружения
+    aiodns = None
+
+# Коды ошибок c-ares / getaddrinfo, означающие «имени нет» и «сбой резолвера»
+_ARES_NOT_FOUND = {1, 4}  # ARES_ENODATA, ARES_ENOTFOUND
+_GAI_NOT_FOUND = {
+    getattr(socket, name)
+    for name in ("EAI_NONAME", "EAI_NODATA")
+    if hasattr(socket, name)
+}
+
+CacheKey = Tuple[str, int, int]
+
+
+class _Entry:
+    __slots__ = ("expires_at", "addresses", "error")
+
+    def __init__(
+        self,
+        expires_at: float,
+        addresses: Optional[List[dict]] = None,
+        error: Optional[OSError] = None,
+    ):
+        self.expires_at = expires_at
+        self.addresses = addresses
+        self.error = error
+
+
+class DNSCache:
+    """Кэш DNS процесса с учётом TTL и кратким кэшированием отказов.
+
+    Положительные ответы живут TTL записи (в пределах
+    ``DNS_MIN_TTL_SECONDS``..``DNS_MAX_TTL_SECONDS``), NXDOMAIN —
+    ``DNS_NEGATIVE_TTL_SECONDS``, SERVFAIL и таймауты —
+    ``DNS_SERVFAIL_TTL_SECONDS``. Одновременные запросы одного имени
+    объединяются в один поход в резолвер.
+    """
+
+    def __init__(self):
+        self._entries: Dict[CacheKey, _Entry] = {}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self._aiodns_resolver = None
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.coalesced = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "coalesced": self.coalesced,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def pin(self, host: str, address: str, port: int = 0) -> None:
+        """Бессрочная запись host -> address (локальные стенды и бенчмарки)."""
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        addresses = [
+            {
+                "hostname": host,
+                "host": address,
+                "port": port,
+                "family": family,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            }
+        ]
+        for key_family in (family, socket.AF_UNSPEC):
+            self._store((host, port, key_family), _Entry(math.inf, addresses))
+
+    def _lookup_cached(self, key: CacheKey) -> Optional[List[dict]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        if entry.error is not None:
+            self.negative_hits += 1
+            # Новый экземпляр, чтобы не копить traceback в закэшированном
+            raise type(entry.error)(*entry.error.args)
+        self.hits += 1
+        return entry.addresses
+
+    def _store(self, key: CacheKey, entry: _Entry) -> None:
+        if len(self._entries) >= settings.dns_cache_max_entries:
+            now = time.monotonic()
+            self._entries = {
+                k: e for k, e in self._entries.items() if e.expires_at > now
+            }
+            # Если всё ещё полно — вытесняем самые старые записи
+            while len(self._entries) >= settings.dns_cache_max_entries:
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = entry
+
+    def _store_error(self, key: CacheKey, error: OSError, not_found: bool) -> None:
+        ttl = (
+            settings.dns_negative_ttl_seconds
+            if not_found
+            else settings.dns_servfail_ttl_seconds
+        )
+        self._store(key, _Entry(time.monotonic() + ttl, error=error))
+
+    def _store_addresses(self, key: CacheKey, addresses: List[dict], ttl: float):
+        ttl = min(max(ttl, settings.dns_min_ttl_seconds), settings.dns_max_ttl_seconds)
+        self._store(key, _Entry(time.monotonic() + ttl, addresses=addresses))
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> List[dict]:
+        key = (host, port, family)
+        cached = self._lookup_cached(key)
+        if cached is not None:
+            return cached
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            addresses, ttl = await self._query(host, port, family)
+            self._store_addresses(key, addresses, ttl)
+            future.set_result(addresses)
+            return addresses
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                future.exception()  # помечаем исключение как полученное
+
+    async def _query(
+        self, host: str, port: int, family: int
+    ) -> Tuple[List[dict], float]:
+        key = (host, port, family)
+        if aiodns is not None:
+            try:
+                return await self._query_aiodns(host, port, family)
+            except aiodns.error.DNSError as e:
+                # c-ares не читает /etc/hosts и search-домены — пробуем системный
+                # резолвер, он же и классифицирует отказ для негативного кэша
+                logger.debug(f"aiodns lookup failed for {host}: {e}")
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(
+                host, port, type=socket.SOCK_STREAM, family=family
+            )
+        except socket.gaierror as e:
+            self._store_error(key, e, e.errno in _GAI_NOT_FOUND)
+            raise
+        return _addresses_from_addrinfo(host, infos), settings.dns_default_ttl_seconds
+
+    async def _query_aiodns(
+        self, host: str, port: int, family: int
+    ) -> Tuple[List[dict], float]:
+        if self._aiodns_resolver is None:
+            self._aiodns_resolver = aiodns.DNSResolver()
+        qtypes = []
+        if family in (socket.AF_INET, socket.AF_UNSPEC):
+            qtypes.append(("A", socket.AF_INET))
+        if family in (socket.AF_INET6, socket.AF_UNSPEC):
+            qtypes.append(("AAAA", socket.AF_INET6))
+        addresses = []
+        ttls = []
+        last_error = None
+        for qtype, record_family in qtypes:
+            try:
+                records = await self._aiodns_resolver.query(host, qtype)
+            except aiodns.error.DNSError as e:
+                last_error = e
+                continue
+            for record in records:
+                ttls.append(record.ttl)
+                addresses.append(
+                    {
+                        "hostname": host,
+                        "host": record.host,
+                        "port": port,
+                        "family": record_family,
+                        "proto": 0,
+                        "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+                    }
+                )
+        if not addresses:
+            raise last_error or aiodns.error.DNSError(4, "No addresses")
+        return addresses, min(ttls)
+
+
+def _addresses_from_addrinfo(host: str, infos: list) -> List[dict]:
+    return [
+        {
+            "hostname": host,
+            "host": address[0],
+            "port": address[1],
+            "family": family,
+            "proto": proto,
+            "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+        }
+        for family, _, proto, _, address in infos
+    ]
+
+
+class CachingResolver(AbstractResolver):
+    """Резолвер aiohttp поверх общего ``DNSCache`` процесса."""
+
+    def __init__(self, cache: Optional["DNSCache"] = None):
+        self._cache = cache or get_dns_cache()
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> List[dict]:
+        return await self._cache.resolve(host, port, family)
+
+    async def close(self) -> None:
+        pass
+
+
+_dns_cache: Optional[DNSCache] = None
+
+
+def get_dns_cache() -> DNSCache:
+    global _dns_cache
+    if _dns_cache is None:
+        _dns_cache = DNSCache()
+        logger.debug(
+            f"Created DNS cache (aiodns {'enabled' if aiodns else 'not installed'})"
+        )
+    return _dns_cache
+
+
+def reset_after_fork() -> None:
+    """Резолвер aiodns привязан к loop родителя: дочерний процесс начинает
+    с собственного кэша."""
+    global _dns_cache
+    _dns_cache = None
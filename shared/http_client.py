@@ -0,0 +1,264 @@
+# shared/http_client.py
+import aiohttp
+import asyncio
+import socket
+import ssl
+from typing import Awaitable, Optional, TypeVar
+from shared.config import settings
+from shared.dns_cache import CachingResolver, get_dns_cache
+from shared.logger_setup import logger
+
+try:  # HTTP/2 для проверок (httpx[http2]); без него все запросы идут через aiohttp
+    import h2  # noqa: F401
+    import httpcore
+    import httpx
+except ImportError:  # pragma: no cover - зависит от окружения
+    httpx = None
+
+T = TypeVar("T")
+
+USER_AGENT = "WebsiteMonitorBot/1.0"
+
+_async_session: Optional[aiohttp.ClientSession] = None
+_async_session_loop: Optional[asyncio.AbstractEventLoop] = None
+_http2_client = None
+_http2_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_process_loop: Optional[asyncio.AbstractEventLoop] = None
+_ssl_context: Optional[ssl.SSLContext] = None
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    """Общий SSL-контекст процесса: хранилище CA загружается один раз."""
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+def get_async_session() -> aiohttp.ClientSession:
+    """Долгоживущая ``aiohttp.ClientSession`` текущего event loop.
+
+    Сессия привязана к loop, в котором создана; если вызвать функцию из
+    другого loop, будет создана новая сессия для него.
+    """
+    global _async_session, _async_session_loop
+    loop = asyncio.get_running_loop()
+    if (
+        _async_session is None
+        or _async_session.closed
+        or _async_session_loop is not loop
+    ):
+        connector = aiohttp.TCPConnector(
+            limit=settings.http_pool_size,
+            limit_per_host=settings.http_pool_per_host,
+            keepalive_timeout=settings.http_keepalive_seconds,
+            # Собственный кэш aiohttp не знает TTL и не кэширует отказы
+            resolver=CachingResolver(),
+            use_dns_cache=False,
+            ssl=get_ssl_context(),
+        )
+        _async_session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=settings.check_timeout_seconds),
+        )
+        _async_session_loop = loop
+        logger.debug("Created shared async HTTP session")
+    return _async_session
+
+
+if httpx is not None:
+
+    class _CachedDNSNetworkBackend(httpcore.AsyncNetworkBackend):
+        """Сетевой backend httpcore, берущий адрес хоста из ``DNSCache``.
+
+        Подменяется только адрес для ``connect``: SNI и проверка сертификата
+        получают исходное имя.
+        """
+
+        def __init__(self):
+            self._backend = httpcore.AnyIOBackend()
+
+        async def connect_tcp(
+            self, host, port, timeout=None, local_address=None, socket_options=None
+        ):
+            try:
+                addresses = await get_dns_cache().resolve(host, port, socket.AF_UNSPEC)
+            except OSError as e:
+                raise httpcore.ConnectError(f"Failed to resolve {host}: {e}") from e
+            return await self._backend.connect_tcp(
+                addresses[0]["host"], port, timeout, local_address, socket_options
+            )
+
+        async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+            return await self._backend.connect_unix_socket(
+                path, timeout, socket_options
+            )
+
+        async def sleep(self, seconds: float) -> None:
+            await self._backend.sleep(seconds)
+
+    # Исключения httpcore (общего базового класса у них нет)
+    _HTTPCORE_ERRORS = (
+        httpcore.NetworkError,
+        httpcore.ProtocolError,
+        httpcore.ProxyError,
+        httpcore.TimeoutException,
+        httpcore.UnsupportedProtocol,
+    )
+
+    def _httpx_error(error: Exception, request: "httpx.Request") -> Exception:
+        """Исключение httpx того же имени, что и исключение httpcore."""
+        error_class = getattr(httpx, type(error).__name__, httpx.TransportError)
+        if not issubclass(error_class, httpx.TransportError):
+            error_class = httpx.TransportError
+        return error_class(str(error), request=request)
+
+    class _PoolResponseStream(httpx.AsyncByteStream):
+        def __init__(self, stream, request: "httpx.Request"):
+            self._stream = stream
+            self._request = request
+
+        async def __aiter__(self):
+            try:
+                async for chunk in self._stream:
+                    yield chunk
+            except _HTTPCORE_ERRORS as e:
+                raise _httpx_error(e, self._request) from e
+
+        async def aclose(self) -> None:
+            if hasattr(self._stream, "aclose"):
+                await self._stream.aclose()
+
+    class _CachedDNSHTTP2Transport(httpx.AsyncBaseTransport):
+        """Транспорт httpx с HTTP/2, чьи соединения разрешают имена через ``DNSCache``.
+
+        ``httpx.AsyncHTTPTransport`` не принимает ``network_backend``, поэтому
+        транспорт собран на публичных API: свой ``httpcore.AsyncConnectionPool``
+        и перевод запросов, ответов и исключений между httpx и httpcore.
+        """
+
+        def __init__(self, limits: "httpx.Limits"):
+            self._pool = httpcore.AsyncConnectionPool(
+                ssl_context=get_ssl_context(),
+                max_connections=limits.max_connections,
+                max_keepalive_connections=limits.max_keepalive_connections,
+                keepalive_expiry=limits.keepalive_expiry,
+                http2=True,
+                network_backend=_CachedDNSNetworkBackend(),
+            )
+
+        async def handle_async_request(
+            self, request: "httpx.Request"
+        ) -> "httpx.Response":
+            pool_request = httpcore.Request(
+                method=request.method,
+                url=httpcore.URL(
+                    scheme=request.url.raw_scheme,
+                    host=request.url.raw_host,
+                    port=request.url.port,
+                    target=request.url.raw_path,
+                ),
+                headers=request.headers.raw,
+                content=request.stream,
+                extensions=request.extensions,
+            )
+            try:
+                response = await self._pool.handle_async_request(pool_request)
+            except _HTTPCORE_ERRORS as e:
+                raise _httpx_error(e, request) from e
+            return httpx.Response(
+                status_code=response.status,
+                headers=response.headers,
+                stream=_PoolResponseStream(response.stream, request),
+                extensions=response.extensions,
+            )
+
+        async def aclose(self) -> None:
+            await self._pool.aclose()
+
+
+def http2_available() -> bool:
+    return httpx is not None
+
+
+def get_http2_client() -> "httpx.AsyncClient":
+    """Долгоживущий HTTP/2-клиент httpx текущего event loop.
+
+    Нужен для мультиплексирования проверок многих путей одного хоста в одно
+    соединение. Если сервер не договаривается о h2 (ALPN), httpx сам
+    выполняет запрос по HTTP/1.1. Имена разрешаются через общий ``DNSCache``.
+    """
+    global _http2_client, _http2_client_loop
+    loop = asyncio.get_running_loop()
+    if (
+        _http2_client is None
+        or _http2_client.is_closed
+        or _http2_client_loop is not loop
+    ):
+        limits = httpx.Limits(
+            max_connections=settings.http_pool_size,
+            keepalive_expiry=settings.http_keepalive_seconds,
+        )
+        _http2_client = httpx.AsyncClient(
+            transport=_CachedDNSHTTP2Transport(limits),
+            headers={"User-Agent": USER_AGENT},
+            timeout=settings.check_timeout_seconds,
+            follow_redirects=True,
+        )
+        _http2_client_loop = loop
+        logger.debug("Created shared HTTP/2 client")
+    return _http2_client
+
+
+async def close_async_session() -> None:
+    """Закрывает асинхронные HTTP-клиенты процесса (aiohttp и HTTP/2)."""
+    global _async_session, _async_session_loop, _http2_client, _http2_client_loop
+    if _async_session is not None and not _async_session.closed:
+        await _async_session.close()
+        logger.debug("Closed shared async HTTP session")
+    _async_session = None
+    _async_session_loop = None
+    if _http2_client is not None and not _http2_client.is_closed:
+        await _http2_client.aclose()
+        logger.debug("Closed shared HTTP/2 client")
+    _http2_client = None
+    _http2_client_loop = None
+
+
+def run_in_process_loop(coro: Awaitable[T]) -> T:
+    """Выполняет корутину в долгоживущем event loop процесса.
+
+    В отличие от ``asyncio.run`` loop не закрывается между вызовами, поэтому
+    пул соединений общей aiohttp-сессии переживает отдельные задачи Celery.
+    """
+    global _process_loop
+    if _process_loop is None or _process_loop.is_closed():
+        _process_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_process_loop)
+    return _process_loop.run_until_complete(coro)
+
+
+def reset_after_fork() -> None:
+    """Забывает клиенты и event loop, унаследованные от родителя при fork.
+
+    Сокеты пулов родителя нельзя делить с дочерним процессом, а закрывать
+    их здесь — значит закрыть соединения родителя: дочерний процесс просто
+    создаёт свои клиенты и loop при первом обращении.
+    """
+    global _async_session, _async_session_loop
+    global _http2_client, _http2_client_loop, _process_loop
+    _async_session = None
+    _async_session_loop = None
+    _http2_client = None
+    _http2_client_loop = None
+    _process_loop = None
+
+
+def close_http_clients() -> None:
+    """Закрывает общие HTTP-клиенты процесса (хук остановки воркера)."""
+    global _process_loop
+    if _process_loop is not None and not _process_loop.is_closed():
+        _process_loop.run_until_complete(close_async_session())
+        _process_loop.close()
+    _process_loop = None
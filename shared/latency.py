@@ -0,0 +1,177 @@
+# shared/latency.py
+import math
+import time
+from typing import Dict, Iterable, Mapping, Optional
+from shared.config import settings
+from shared.logger_setup import logger
+from shared.redis_client import get_async_redis, get_redis
+
+# Гистограммы времени ответа: hash latency:{site_id}:{час} (бакет -> счётчик)
+LATENCY_KEY_PREFIX = "latency"
+PERCENTILES = (0.5, 0.95, 0.99)
+
+# Относительная погрешность квантилей и диапазон значений (мс).
+# При 1% и диапазоне 0.1 мс .. 10 мин на сайт приходится не более ~800 бакетов.
+_RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + _RELATIVE_ACCURACY) / (1 - _RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_MS = 0.1
+_MAX_MS = 600_000.0
+
+
+def _bucket(value_ms: float) -> int:
+    value_ms = min(max(value_ms, _MIN_MS), _MAX_MS)
+    return math.ceil(math.log(value_ms) / _LOG_GAMMA)
+
+
+def _bucket_value(index: int) -> float:
+    # Середина бакета (gamma^(i-1), gamma^i] с погрешностью не больше _RELATIVE_ACCURACY
+    return 2 * _GAMMA**index / (_GAMMA + 1)
+
+
+class LatencyHistogram:
+    """Гистограмма с логарифмическими бакетами (в духе HDR Histogram).
+
+    Память ограничена числом бакетов в диапазоне значений, а две гистограммы
+    (например, от разных воркеров) сливаются сложением счётчиков — ровно так
+    их и суммирует ``HINCRBY`` в Redis.
+    """
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self, counts: Optional[Mapping[int, int]] = None):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        if counts:
+            self.merge(counts)
+
+    def add(self, value_ms: float, count: int = 1) -> None:
+        index = _bucket(value_ms)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+
+    def merge(self, other) -> None:
+        counts = other.counts if isinstance(other, LatencyHistogram) else other
+        for index, count in counts.items():
+            index, count = int(index), int(count)
+            self.counts[index] = self.counts.get(index, 0) + count
+            self.total += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q]).get(q)
+
+    def quantiles(self, qs: Iterable[float] = PERCENTILES) -> Dict[float, float]:
+        if not self.total:
+            return {}
+        targets = sorted(qs)
+        result = {}
+        seen = 0
+        pending = iter(targets)
+        q = next(pending)
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            while q is not None and seen >= q * self.total:
+                result[q] = _bucket_value(index)
+                q = next(pending, None)
+            if q is None:
+                break
+        return result
+
+
+def _window_hour(now: float) -> int:
+    return int(now // 3600)
+
+
+def _key(site_id: int, hour: int) -> str:
+    return f"{LATENCY_KEY_PREFIX}:{site_id}:{hour}"
+
+
+class LatencyRecorder:
+    """Копит гистограммы процесса и сбрасывает их в Redis пачкой.
+
+    Каждый воркер пишет в почасовые hash'и через ``HINCRBY``, так что
+    данные шардов сливаются в Redis без координации между воркерами.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[int, LatencyHistogram] = {}
+
+    def record(self, site_id: int, latency_ms: float) -> None:
+        histogram = self._histograms.get(site_id)
+        if histogram is None:
+            histogram = self._histograms[site_id] = LatencyHistogram()
+        histogram.add(latency_ms)
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """Сбрасывает накопленное в Redis; возвращает число сайтов."""
+        if not self._histograms:
+            return 0
+        hour = _window_hour(now or time.time())
+        ttl = (settings.latency_window_hours + 1) * 3600
+        pipe = get_redis().pipeline(transaction=False)
+        for site_id, histogram in self._histograms.items():
+            key = _key(site_id, hour)
+            for index, count in histogram.counts.items():
+                pipe.hincrby(key, index, count)
+            pipe.expire(key, ttl)
+        pipe.execute()
+        flushed = len(self._histograms)
+        self._histograms = {}
+        logger.debug(f"Flushed latency histograms for {flushed} sites")
+        return flushed
+
+
+def _window_keys(site_ids: Iterable[int], now: Optional[float]) -> list:
+    hour = _window_hour(now or time.time())
+    hours = range(hour - settings.latency_window_hours + 1, hour + 1)
+    return [(site_id, _key(site_id, h)) for site_id in site_ids for h in hours]
+
+
+def _percentiles_from(keys: list, replies: list) -> Dict[int, Dict[str, float]]:
+    histograms: Dict[int, LatencyHistogram] = {}
+    for (site_id, _), counts in zip(keys, replies):
+        if counts:
+            histograms.setdefault(site_id, LatencyHistogram()).merge(counts)
+    return {
+        site_id: {
+            f"p{round(q * 100)}": value
+            for q, value in histogram.quantiles(PERCENTILES).items()
+        }
+        for site_id, histogram in histograms.items()
+    }
+
+
+def get_latency_percentiles(
+    site_ids: Iterable[int], now: Optional[float] = None
+) -> Dict[int, Dict[str, float]]:
+    """p50/p95/p99 (мс) по сайтам за последние ``LATENCY_WINDOW_HOURS`` часов."""
+    keys = _window_keys(site_ids, now)
+    if not keys:
+        return {}
+    pipe = get_redis().pipeline(transaction=False)
+    for _, key in keys:
+        pipe.hgetall(key)
+    return _percentiles_from(keys, pipe.execute())
+
+
+async def get_latency_percentiles_async(
+    site_ids: Iterable[int], now: Optional[float] = None
+) -> Dict[int, Dict[str, float]]:
+    """Асинхронный аналог ``get_latency_percentiles``."""
+    keys = _window_keys(site_ids, now)
+    if not keys:
+        return {}
+    pipe = get_async_redis().pipeline(transaction=False)
+    for _, key in keys:
+        pipe.hgetall(key)
+    return _percentiles_from(keys, await pipe.execute())
+
+
+def format_percentiles(percentiles: Optional[Dict[str, float]]) -> str:
+    if not percentiles:
+        return "нет данных"
+    return " / ".join(
+        f"{percentiles[name]:.0f}"
+        for name in ("p50", "p95", "p99")
+        if name in percentiles
+    )
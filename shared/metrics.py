@@ -0,0 +1,157 @@
+# shared/metrics.py
+import os
+import time
+from typing import Optional, Tuple
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+from shared.logger_setup import logger
+
+# Метрики процесса в формате Prometheus. Веб отдаёт их на /metrics,
+# воркер Celery и бот — собственным HTTP-экспортёром (start_metrics_server).
+# Воркер с пулом prefork работает в multiprocess-режиме prometheus_client
+# (PROMETHEUS_MULTIPROC_DIR): дочерние процессы пишут значения в файлы
+# каталога, а экспортёр главного процесса их суммирует. multiprocess_mode
+# у Gauge задаёт, как сводятся значения процессов.
+
+CYCLE_DURATION = Histogram(
+    "monitoring_cycle_duration_seconds",
+    "Длительность цикла мониторинга от тика до сводки chord",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200),
+)
+CYCLE_CHECKS_PER_SECOND = Gauge(
+    "monitoring_cycle_checks_per_second",
+    "Проверок в секунду в последнем завершённом цикле",
+    multiprocess_mode="mostrecent",
+)
+CHECKS = Counter(
+    "monitoring_checks_total",
+    "Итоговые результаты проверок сайтов",
+    ["result"],
+)
+CHECKS_IN_FLIGHT = Gauge(
+    "monitoring_checks_in_flight",
+    "Запросы проверок, выполняющиеся прямо сейчас",
+    multiprocess_mode="livesum",
+)
+CHECK_RETRIES = Counter(
+    "monitoring_check_retries_total",
+    "Повторные попытки проверок после сетевых ошибок и таймаутов",
+)
+CHECK_DOMAIN_WAIT = Histogram(
+    "monitoring_check_domain_wait_seconds",
+    "Ожидание лимитов домена (одновременные запросы и частота) перед проверкой",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+CHECK_BYTES = Counter(
+    "monitoring_check_bytes_received_total",
+    "Байты ответов (заголовки и полученная часть тела), принятые проверками",
+    ["method"],
+)
+CHECK_HTTP2_REQUESTS = Counter(
+    "monitoring_check_http2_requests_total",
+    "Запросы проверок через HTTP/2-клиент по согласованной версии протокола",
+    ["http_version"],
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Время выполнения SQL-запросов",
+    ["operation"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+NOTIFICATION_QUEUE_DEPTH = Gauge(
+    "notification_queue_depth",
+    "Сообщения в очереди уведомлений",
+    ["queue"],
+    multiprocess_mode="mostrecent",
+)
+NOTIFICATION_SEND_DURATION = Histogram(
+    "notification_send_duration_seconds",
+    "Время запроса sendMessage к Telegram",
+    ["outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+BOT_HANDLER_DURATION = Histogram(
+    "bot_handler_duration_seconds",
+    "Время обработки апдейта хендлером бота",
+    ["handler"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+_SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY"}
+_metrics_server_port: Optional[int] = None
+
+
+def _sql_operation(statement: str) -> str:
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    return operation if operation in _SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine) -> None:
+    """Замер времени запросов движка SQLAlchemy (для async — его ``sync_engine``)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_DURATION.labels(_sql_operation(statement)).observe(
+            time.perf_counter() - started
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(exception_context):
+        # Запрос с ошибкой не доходит до after_cursor_execute
+        connection = exception_context.connection
+        stack = connection.info.get("query_started") if connection else None
+        if stack:
+            stack.pop()
+
+
+def _multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def _registry() -> CollectorRegistry:
+    """Реестр для выдачи: в multiprocess-режиме — сводка файлов всех процессов."""
+    if not _multiprocess_enabled():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Текущие метрики процесса и их Content-Type."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Убирает live-значения Gauge завершившегося дочернего процесса."""
+    if _multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
+
+
+def start_metrics_server(port: int) -> None:
+    """Поднимает HTTP-экспортёр метрик процесса (один раз; 0 — выключен)."""
+    global _metrics_server_port
+    if not port or _metrics_server_port is not None:
+        return
+    try:
+        start_http_server(port, registry=_registry())
+    except OSError as e:
+        logger.error(f"Failed to start metrics exporter on port {port}: {e}")
+        return
+    _metrics_server_port = port
+    logger.info(f"Metrics exporter listening on port {port}")
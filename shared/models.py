@@ -7,7 +7,10 @@ from sqlalchemy import (
     ForeignKey,
     Boolean,
     DateTime,
+    Float,
+    SmallInteger,
     UniqueConstraint,
+    Index,
 )
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func  # Для времени по умолчанию
@@ -38,6 +41,12 @@ class Site(Base):
     last_notified = Column(
         DateTime(timezone=True), nullable=True
     )  # Время последнего уведомления
+    # Индивидуальный интервал проверки; NULL — глобальный check_interval_minutes
+    check_interval_seconds = Column(Integer, nullable=True)
+    # Тип проверки: http — HTTP-запрос, tcp — TCP connect, tls — TLS-рукопожатие
+    check_type = Column(
+        String(8), nullable=False, default="http", server_default="http"
+    )
     user = relationship("User", back_populates="sites", lazy="selectin")
 
     # Добавляем ограничение уникальности: один URL на одного пользователя
@@ -55,3 +64,90 @@ class SystemSettings(Base):
 
     def __repr__(self):
         return f"<SystemSettings(key='{self.key}', value='{self.value}')>"
+
+
+class MonitoringCycle(Base):
+    """Итоги одного цикла мониторинга (заполняется агрегатором chord)."""
+
+    __tablename__ = "monitoring_cycles"
+    id = Column(Integer, primary_key=True)
+    started_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    finished_at = Column(DateTime(timezone=True), server_default=func.now())
+    duration_seconds = Column(Float, nullable=False)
+    chunks = Column(Integer, nullable=False, default=0)
+    checked = Column(Integer, nullable=False, default=0)
+    up = Column(Integer, nullable=False, default=0)
+    down = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"<MonitoringCycle(id={self.id}, duration={self.duration_seconds:.2f}s, "
+            f"checked={self.checked}, up={self.up}, down={self.down}, errors={self.errors})>"
+        )
+
+
+class SiteCheck(Base):
+    """История проверок сайтов.
+
+    Таблица секционирована по ``checked_at`` (одна секция на сутки UTC,
+    см. ``shared.db.ensure_site_check_partitions_sync``), поэтому старые
+    данные удаляются ``DROP TABLE`` секции, а не ``DELETE``. Внешнего ключа
+    на ``sites`` нет, чтобы удаление сайта не упиралось в его историю.
+    """
+
+    __tablename__ = "site_checks"
+    __table_args__ = {"postgresql_partition_by": "RANGE (checked_at)"}
+    site_id = Column(Integer, primary_key=True)
+    checked_at = Column(DateTime(timezone=True), primary_key=True)
+    is_available = Column(Boolean, nullable=False)
+    status_code = Column(SmallInteger, nullable=True)
+    latency_ms = Column(Float, nullable=True)
+    error = Column(
+        String(64), nullable=True
+    )  # Класс ошибки, например ClientConnectorError
+
+    def __repr__(self):
+        return (
+            f"<SiteCheck(site_id={self.site_id}, checked_at={self.checked_at}, "
+            f"available={self.is_available}, status={self.status_code})>"
+        )
+
+
+class SiteCheckRollup(Base):
+    """Агрегаты истории проверок по интервалам: minute, hour и day.
+
+    Строятся задачей ``bot.monitoring.rollup_site_checks`` из ``site_checks``
+    (минуты) и из более мелких агрегатов (часы и сутки). Отчёты о доступности
+    читают только эту таблицу. Счётчики ``latency_le_*`` — грубая гистограмма
+    времени ответа по непересекающимся диапазонам (``latency_le_300`` —
+    (100, 300] мс); в ``latency_*`` учитываются только проверки с HTTP-ответом.
+    """
+
+    __tablename__ = "site_check_rollups"
+    # Для прореживания старых агрегатов по разрешению и времени
+    __table_args__ = (
+        Index("ix_site_check_rollups_resolution_bucket", "resolution", "bucket_start"),
+    )
+    site_id = Column(Integer, primary_key=True)
+    resolution = Column(String(8), primary_key=True)  # minute | hour | day
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    checks = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+    latency_count = Column(Integer, nullable=False, default=0)
+    latency_sum_ms = Column(Float, nullable=False, default=0.0)
+    latency_le_100 = Column(Integer, nullable=False, default=0)
+    latency_le_300 = Column(Integer, nullable=False, default=0)
+    latency_le_1000 = Column(Integer, nullable=False, default=0)
+    latency_le_3000 = Column(Integer, nullable=False, default=0)
+    latency_gt_3000 = Column(Integer, nullable=False, default=0)
+    # Нарастающие итоги по сайту (только для resolution = hour): проверки
+    # за любое окно — разность двух значений, см. shared.db.get_sites_uptime
+    cum_checks = Column(BigInteger, nullable=False, server_default="0")
+    cum_failures = Column(BigInteger, nullable=False, server_default="0")
+
+    def __repr__(self):
+        return (
+            f"<SiteCheckRollup(site_id={self.site_id}, {self.resolution}@{self.bucket_start}, "
+            f"checks={self.checks}, failures={self.failures})>"
+        )
@@ -1,60 +1,516 @@
 # shared/monitoring.py
 import aiohttp
 import asyncio
+import heapq
+import random
+import socket
+import ssl
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from shared.config import settings
+from shared.dns_cache import get_dns_cache
+from shared.http_client import (
+    get_async_session,
+    get_http2_client,
+    get_ssl_context,
+    http2_available,
+    httpx,
+)
 from shared.logger_setup import logger
+from shared.metrics import (
+    CHECK_BYTES,
+    CHECK_DOMAIN_WAIT,
+    CHECK_HTTP2_REQUESTS,
+    CHECK_RETRIES,
+    CHECKS,
+    CHECKS_IN_FLIGHT,
+)
 from shared.models import Site
+from shared.rate_limit import DomainLimiter, get_domain_limiter
 from sqlalchemy.sql import text
 
 
-async def check_website_async(url: str, retries: int = 2) -> bool:
-    """Проверяет доступность сайта асинхронно."""
-    logger.debug(f"Начинаем асинхронную проверку сайта: {url}")
-    headers = {"User-Agent": "WebsiteMonitorBot/1.0 (Async Check)"}
-    # Устанавливаем таймаут для всех операций
-    timeout = aiohttp.ClientTimeout(total=10)
+async def check_website_async(
+    url: str, retries: int = 2, check_type: str = "http"
+) -> bool:
+    """Проверяет доступность сайта асинхронно через общую HTTP-сессию процесса.
 
+    Одиночная проверка (бот, админка) идёт через тот же ``CheckEngine``, что
+    и цикл мониторинга, с его очередью повторов.
+    """
+    logger.debug(f"Начинаем асинхронную проверку сайта: {url}")
     try:
-        async with aiohttp.ClientSession(headers=headers, timeout=timeout) as session:
-            for attempt in range(retries):
+        async with CheckEngine(concurrency=1, timeout=10, retries=retries) as engine:
+            result = await engine.check(url, check_type)
+    except Exception as e:
+        logger.error(f"Ошибка асинхронной проверки {url}: {e}", exc_info=True)
+        return False
+    logger.info(
+        f"{url} — {'доступен' if result.is_available else 'недоступен'} "
+        f"(статус: {result.status_code}, попыток: {result.attempts})"
+    )
+    return result.is_available
+
+
+# Типы проверок сайта (Site.check_type): HTTP-запрос, TCP-соединение, TLS-рукопожатие
+CHECK_TYPES = ("http", "tcp", "tls")
+_DEFAULT_PORTS = {"http": 80, "https": 443, "tls": 443}
+_TLS_DEFAULT_PORT = 443
+
+
+def parse_site_url(url: str) -> str:
+    """Проверяет адрес сайта и возвращает тип проверки по его схеме.
+
+    ``http(s)://...`` — HTTP-проверка, ``tcp://хост:порт`` — TCP connect,
+    ``tls://хост[:порт]`` — TLS-рукопожатие (по умолчанию порт 443).
+    """
+    parts = urlsplit(url)
+    if parts.scheme in ("http", "https"):
+        check_type = "http"
+    elif parts.scheme in ("tcp", "tls"):
+        check_type = parts.scheme
+    else:
+        raise ValueError(f"Unsupported scheme in {url!r}")
+    if not parts.hostname:
+        raise ValueError(f"No host in {url!r}")
+    port = parts.port  # ValueError, если порт не число или вне диапазона
+    if check_type == "tcp" and port is None:
+        raise ValueError(f"TCP check requires a port: {url!r}")
+    return check_type
+
+
+def validate_check_type(url: str, check_type: str) -> None:
+    """Проверяет, что тип проверки применим к адресу сайта, иначе ``ValueError``.
+
+    HTTP-проверке нужен ``http(s)://`` адрес; tcp и tls применимы к любому
+    адресу: порт берётся из URL или по умолчанию (см. ``probe_target``).
+    """
+    if check_type not in CHECK_TYPES:
+        raise ValueError(f"Check type must be one of: {', '.join(CHECK_TYPES)}")
+    if check_type == "http" and urlsplit(url).scheme not in ("http", "https"):
+        raise ValueError(f"HTTP check requires an http:// or https:// URL: {url!r}")
+
+
+def probe_target(url: str, check_type: str) -> str:
+    """Адрес для ``CheckEngine``: URL для http, ``tcp|tls://хост:порт`` иначе.
+
+    Порт берётся из URL, а без него — по схеме (http 80, https и tls 443);
+    TLS-рукопожатие без явного порта всегда идёт на 443, даже для ``http://``.
+    """
+    if check_type == "http":
+        return url
+    parts = urlsplit(url)
+    if parts.port:
+        port = parts.port
+    elif check_type == "tls":
+        port = _TLS_DEFAULT_PORT
+    else:
+        port = _DEFAULT_PORTS[parts.scheme]
+    host = f"[{parts.hostname}]" if ":" in parts.hostname else parts.hostname
+    return f"{check_type}://{host}:{port}"
+
+
+@dataclass
+class CheckResult:
+    """Результат проверки одного URL."""
+
+    url: str
+    is_available: bool
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    # Длительность последней попытки и момент её завершения
+    latency_ms: Optional[float] = None
+    checked_at: Optional[datetime] = None
+    # Метод, по ответу на который принято решение (HEAD/GET, TCP/TLS),
+    # и принятые байты попытки
+    method: Optional[str] = None
+    bytes_received: int = 0
+
+
+# Статусы, которыми серверы отвечают на неподдерживаемый HEAD
+_HEAD_REJECTED_STATUSES = {405, 501}
+# Предел размера запоминаемых множеств хостов ниже (при переполнении — сброс)
+_REMEMBERED_HOSTS_MAX = 10000
+# Хосты, отклонившие HEAD: им сразу идёт GET (общий для процесса)
+_head_rejected_hosts = set()
+# https-хосты (host, port), не договорившиеся о HTTP/2: дальше только пул aiohttp
+_http1_only_origins = set()
+
+# Ошибки попытки, после которых проверка повторяется
+_RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError) + (
+    (httpx.RequestError,) if httpx is not None else ()
+)
+
+
+def _origin(url: str) -> Tuple[Optional[str], Optional[int]]:
+    parts = urlsplit(url)
+    return parts.hostname, parts.port or 443
+
+
+def _response_head_size(response: aiohttp.ClientResponse) -> int:
+    """Размер строки статуса и заголовков ответа в байтах (с CRLF)."""
+    status_line = 13 + len(response.reason or "")  # "HTTP/1.1 200 " + reason
+    headers = sum(len(name) + len(value) + 4 for name, value in response.raw_headers)
+    return status_line + headers + 2
+
+
+def _httpx_head_size(response) -> int:
+    """Оценка размера заголовков ответа httpx (для HTTP/2 — до сжатия HPACK)."""
+    status_line = 13 + len(response.reason_phrase or "")
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers.raw)
+    return status_line + headers + 2
+
+
+class CheckEngine:
+    """Асинхронный движок проверок для всего цикла мониторинга.
+
+    Все проверки идут через общую ``aiohttp.ClientSession`` процесса
+    (``shared.http_client``), так что пул соединений переживает и цикл,
+    и отдельные задачи Celery, а общее число одновременных запросов ограничено
+    ``concurrency``. Сетевые ошибки и таймауты повторяются до ``retries``
+    попыток через очередь повторов (база задержки ``retry_delay``), ответ
+    с любым HTTP-статусом считается окончательным.
+
+    Статус определяется по строке статуса и заголовкам, тело ответа не
+    скачивается: в режиме ``head`` сначала идёт ``HEAD``, а если сервер его
+    отклоняет или отвечает ошибкой — ``GET``, соединение которого закрывается
+    до чтения тела.
+
+    Проверки типов ``tcp`` и ``tls`` (адреса ``tcp|tls://хост:порт``, см.
+    ``probe_target``) — только установка соединения и TLS-рукопожатие, без HTTP.
+
+    Запросы к одному регистрируемому домену ограничены по числу одновременных
+    и по частоте (``shared.rate_limit.DomainLimiter``, настройки
+    ``CHECK_DOMAIN_*``), чтобы проверки не походили на флуд и не получали бан.
+
+    Если в ``check_many`` на один https-хост приходится не меньше
+    ``HTTP2_MIN_GROUP_SIZE`` адресов, его запросы идут через HTTP/2-клиент
+    (``shared.http_client.get_http2_client``) и мультиплексируются в одно
+    соединение. Хосты без h2 запоминаются и дальше проверяются через пул
+    HTTP/1.1.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+        probe_method: Optional[str] = None,
+        http2: Optional[bool] = None,
+    ):
+        self.concurrency = concurrency or settings.check_concurrency
+        self.timeout = timeout or settings.check_timeout_seconds
+        self.retries = retries or settings.check_retries
+        self.retry_delay = (
+            retry_delay
+            if retry_delay is not None
+            else settings.check_retry_delay_seconds
+        )
+        self.probe_method = probe_method or settings.check_probe_method
+        self.http2 = (
+            settings.http2_enabled if http2 is None else http2
+        ) and http2_available()
+        self._http2_origins = set()
+        self._client_timeout = aiohttp.ClientTimeout(total=self.timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._limiter: Optional[DomainLimiter] = None
+
+    async def __aenter__(self) -> "CheckEngine":
+        # Сессия общая для процесса и не закрывается вместе с движком
+        self._session = get_async_session()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # Лимиты доменов общие для процесса: следующий движок их продолжает
+        self._limiter = get_domain_limiter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._session = None
+        logger.debug(f"DNS cache stats: {get_dns_cache().stats()}")
+
+    async def _request(self, method: str, url: str, result: CheckResult) -> int:
+        """Запрос без чтения тела: решение принимается по статусу и заголовкам."""
+        if self._http2_origins and _origin(url) in self._http2_origins:
+            return await self._request_http2(method, url, result)
+        async with self._session.request(
+            method, url, allow_redirects=True, timeout=self._client_timeout
+        ) as response:
+            result.status_code = response.status
+            result.method = method
+            if not response.content.at_eof():
+                # Тело не нужно: закрываем соединение, не дочитывая его
+                response.close()
+            received = response.content.total_bytes + sum(
+                _response_head_size(r) for r in (*response.history, response)
+            )
+        result.bytes_received += received
+        CHECK_BYTES.labels(method).inc(received)
+        return response.status
+
+    async def _request_http2(self, method: str, url: str, result: CheckResult) -> int:
+        """Запрос через HTTP/2-клиент; выход из ``stream`` без чтения тела
+        сбрасывает только поток, а соединение остаётся для остальных путей."""
+        async with get_http2_client().stream(
+            method, url, timeout=self.timeout
+        ) as response:
+            result.status_code = response.status_code
+            result.method = method
+            received = sum(_httpx_head_size(r) for r in (*response.history, response))
+        CHECK_HTTP2_REQUESTS.labels(response.http_version).inc()
+        if response.http_version != "HTTP/2":
+            # ALPN не договорился о h2: httpx уже сходил по HTTP/1.1, а дальше
+            # хост проверяется через общий пул aiohttp
+            origin = _origin(url)
+            self._http2_origins.discard(origin)
+            if len(_http1_only_origins) >= _REMEMBERED_HOSTS_MAX:
+                _http1_only_origins.clear()
+            _http1_only_origins.add(origin)
+        result.bytes_received += received
+        CHECK_BYTES.labels(method).inc(received)
+        return response.status_code
+
+    def _select_http2_origins(self, urls: List[str], check_types: List[str]) -> set:
+        """https-хосты пачки, которым хватает адресов для мультиплексирования."""
+        if not self.http2:
+            return set()
+        counts = Counter(
+            _origin(url)
+            for url, check_type in zip(urls, check_types)
+            if check_type == "http" and url.startswith("https://")
+        )
+        return {
+            origin
+            for origin, count in counts.items()
+            if count >= settings.http2_min_group_size
+            and origin not in _http1_only_origins
+        }
+
+    async def _probe_http(self, url: str, result: CheckResult) -> float:
+        """HEAD и при необходимости GET; доступен — статус 2xx/3xx.
+
+        Повторный GET — второй запрос к домену: он берёт ещё один токен
+        ``DomainLimiter``. Возвращает время ожидания этого токена (секунды).
+        """
+        host = urlsplit(url).hostname
+        if self.probe_method == "get" or host in _head_rejected_hosts:
+            status = await self._request("GET", url, result)
+        else:
+            status = await self._request("HEAD", url, result)
+            if status >= 400:
+                # Часть серверов не поддерживает HEAD или отвечает на него
+                # иначе, чем на GET: ошибку подтверждаем запросом GET
+                if status in _HEAD_REJECTED_STATUSES:
+                    if len(_head_rejected_hosts) >= _REMEMBERED_HOSTS_MAX:
+                        _head_rejected_hosts.clear()
+                    _head_rejected_hosts.add(host)
+                waited = time.perf_counter()
+                await self._limiter.acquire(host or "")
+                domain_wait = time.perf_counter() - waited
+                CHECK_DOMAIN_WAIT.observe(domain_wait)
+                status = await self._request("GET", url, result)
+                result.is_available = 200 <= status < 400
+                return domain_wait
+        result.is_available = 200 <= status < 400
+        return 0.0
+
+    async def _open_connection(self, host: str, port: int, tls: bool):
+        """Соединяется с первым отвечающим адресом хоста, как ``open_connection``
+        с именем хоста: недоступный IPv6 на воркере без IPv6 не делает сайт
+        недоступным. Ошибка TLS-рукопожатия окончательна."""
+        addresses = await get_dns_cache().resolve(host, port, socket.AF_UNSPEC)
+        error: Optional[OSError] = None
+        for address in addresses:
+            try:
+                return await asyncio.open_connection(
+                    address["host"],
+                    port,
+                    ssl=get_ssl_context() if tls else None,
+                    server_hostname=host if tls else None,
+                )
+            except ssl.SSLError:
+                raise
+            except OSError as e:
+                error = e
+        raise error or OSError(f"No addresses resolved for {host}")
+
+    async def _probe_connect(
+        self, target: str, check_type: str, result: CheckResult
+    ) -> None:
+        """TCP-соединение (для ``tls`` — и рукопожатие) без обмена данными.
+
+        Разрешение имени и соединение укладываются в один ``timeout``.
+        """
+        parts = urlsplit(target)
+        _, writer = await asyncio.wait_for(
+            self._open_connection(parts.hostname, parts.port, check_type == "tls"),
+            self.timeout,
+        )
+        # Соединение установлено — этого достаточно; abort не ждёт close_notify
+        writer.transport.abort()
+        result.method = check_type.upper()
+        result.is_available = True
+
+    async def _probe(self, url: str, check_type: str, result: CheckResult) -> None:
+        """Одна попытка; записывает в ``result`` доступность, статус, задержку
+        и время проверки.
+
+        Ожидание лимитов домена (и токена для повторного GET) и свободного слота
+        в задержку ответа не входит.
+        Слот движка занимается только после разрешения домена, так что
+        проверки приторможенного домена не держат слоты остальных сайтов.
+        """
+        waited = time.perf_counter()
+        async with self._limiter.limit(urlsplit(url).hostname or ""):
+            CHECK_DOMAIN_WAIT.observe(time.perf_counter() - waited)
+            async with self._semaphore:
+                started = time.perf_counter()
+                domain_wait = 0.0
+                CHECKS_IN_FLIGHT.inc()
                 try:
-                    async with session.get(url, allow_redirects=True) as response:
-                        is_available = (
-                            200 <= response.status < 400
-                        )  # Считаем редиректы (3xx) успешными
-                        logger.info(
-                            f"{url} — {'доступен' if is_available else 'недоступен'} "
-                            f"(статус: {response.status}, асинхронная попытка {attempt + 1})"
-                        )
-                        return is_available
-                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    logger.warning(
-                        f"Ошибка при асинхронной проверке {url} (попытка {attempt + 1}): {type(e).__name__} - {e}"
-                    )
-                    if attempt < retries - 1:
-                        await asyncio.sleep(
-                            1
-                        )  # Небольшая пауза перед повторной попыткой
-                except Exception as e:
-                    logger.error(
-                        f"Неожиданная ошибка при асинхронной проверке {url}: {e}",
-                        exc_info=True,
+                    if check_type in ("tcp", "tls"):
+                        await self._probe_connect(url, check_type, result)
+                    else:
+                        domain_wait = await self._probe_http(url, result)
+                finally:
+                    CHECKS_IN_FLIGHT.dec()
+                    result.latency_ms = (
+                        time.perf_counter() - started - domain_wait
+                    ) * 1000
+                    result.checked_at = datetime.now(timezone.utc)
+
+    def _backoff(self, attempt: int) -> float:
+        """Пауза перед попыткой ``attempt + 1``: экспонента с джиттером ±50%."""
+        delay = min(
+            self.retry_delay * 2 ** (attempt - 1),
+            settings.check_retry_max_delay_seconds,
+        )
+        return delay * random.uniform(0.5, 1.5)
+
+    async def _attempt(
+        self, url: str, check_type: str, attempt: int
+    ) -> Tuple[CheckResult, bool]:
+        """Одна попытка проверки; второй элемент — нужна ли ещё попытка."""
+        result = CheckResult(url, False, attempts=attempt)
+        retry = False
+        try:
+            await self._probe(url, check_type, result)
+            logger.debug(
+                f"{url} — {'available' if result.is_available else 'unavailable'} "
+                f"(status: {result.status_code} on {result.method}, "
+                f"{result.bytes_received} bytes, attempt {attempt})"
+            )
+        except _RETRYABLE_ERRORS as e:
+            # OSError — отказ соединения, DNS и TLS в проверках tcp/tls
+            logger.debug(f"Error checking {url} (attempt {attempt}): {e!r}")
+            result.error = type(e).__name__
+            retry = attempt < self.retries
+            if not retry:
+                logger.debug(f"Site {url} unavailable after {attempt} attempts.")
+        except Exception as e:
+            logger.error(f"Unexpected error checking {url}: {e}", exc_info=True)
+            result.error = type(e).__name__
+        if result.checked_at is None:
+            result.checked_at = datetime.now(timezone.utc)
+        return result, retry
+
+    async def check(self, url: str, check_type: str = "http") -> CheckResult:
+        """Проверяет один URL с повторами (см. ``check_many``)."""
+        return (await self.check_many([url], [check_type]))[0]
+
+    async def check_many(
+        self, urls: Iterable[str], check_types: Optional[Iterable[str]] = None
+    ) -> List[CheckResult]:
+        """Проверяет все URL конкурентно; результаты в порядке входных URL.
+
+        ``check_types`` — тип проверки каждого URL (``Site.check_type``,
+        по умолчанию ``http``); адреса tcp/tls передаются через ``probe_target``.
+
+        Неудачная попытка не ждёт на месте: URL попадает в очередь повторов
+        (min-heap по времени готовности) с экспоненциальной задержкой и
+        джиттером, а слоты тем временем заняты проверками остальных сайтов.
+        Итог по URL фиксируется после успешного ответа или исчерпания
+        ``retries`` попыток.
+        """
+        urls = list(urls)
+        check_types = list(check_types) if check_types is not None else []
+        check_types += ["http"] * (len(urls) - len(check_types))
+        self._http2_origins = self._select_http2_origins(urls, check_types)
+        loop = asyncio.get_running_loop()
+        results: Dict[int, CheckResult] = {}
+        finished: asyncio.Queue = asyncio.Queue()
+        retry_queue: List[Tuple[float, int, int]] = []  # (ready_at, index, attempt)
+        pending = set()
+
+        def on_done(task: asyncio.Task, index: int) -> None:
+            pending.discard(task)
+            if not task.cancelled():
+                finished.put_nowait((index, task.result()))
+
+        def launch(index: int, attempt: int) -> None:
+            task = loop.create_task(
+                self._attempt(urls[index], check_types[index], attempt)
+            )
+            pending.add(task)
+            task.add_done_callback(lambda t, index=index: on_done(t, index))
+
+        for index in range(len(urls)):
+            launch(index, 1)
+        try:
+            while len(results) < len(urls):
+                timeout = (
+                    max(0.0, retry_queue[0][0] - loop.time()) if retry_queue else None
+                )
+                try:
+                    index, (result, retry) = await asyncio.wait_for(
+                        finished.get(), timeout
                     )
-                    return False  # В случае неожиданной ошибки считаем недоступным
-    except Exception as e:
-        logger.error(f"Ошибка создания aiohttp сессии для {url}: {e}", exc_info=True)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    if retry:
+                        CHECK_RETRIES.inc()
+                        ready_at = loop.time() + self._backoff(result.attempts)
+                        heapq.heappush(
+                            retry_queue, (ready_at, index, result.attempts + 1)
+                        )
+                    else:
+                        results[index] = result
+                        CHECKS.labels("up" if result.is_available else "down").inc()
+                while retry_queue and retry_queue[0][0] <= loop.time():
+                    _, index, attempt = heapq.heappop(retry_queue)
+                    launch(index, attempt)
+        finally:
+            # Отмена цикла (например, по time limit) не оставляет висящих попыток
+            for task in list(pending):
+                task.cancel()
+        return [results[index] for index in range(len(urls))]
+
 
-    return False  # Если все попытки не удались
+async def check_websites_async(
+    urls: Iterable[str],
+    check_types: Optional[Iterable[str]] = None,
+    **engine_kwargs,
+) -> List[CheckResult]:
+    """Проверяет набор URL в рамках одного движка (одна сессия на весь цикл)."""
+    async with CheckEngine(**engine_kwargs) as engine:
+        return await engine.check_many(urls, check_types)
 
 
 async def update_site_availability(
-    session: AsyncSession, site_id: int, url: str
+    session: AsyncSession, site_id: int, url: str, check_type: str = "http"
 ) -> bool:
     """Обновляет статус сайта в БД асинхронно и возвращает статус."""
     logger.debug(f"Асинхронное обновление статуса сайта ID={site_id}, URL={url}")
     try:
-        is_available = await check_website_async(url)
+        is_available = await check_website_async(url, check_type=check_type)
         site = await session.get(
             Site, site_id
         )  # Используем session.get для поиска по PK
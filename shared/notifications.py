@@ -0,0 +1,362 @@
+# shared/notifications.py
+import aiohttp
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from shared.config import settings
+from shared.http_client import get_async_session
+from shared.logger_setup import logger
+from shared.metrics import NOTIFICATION_QUEUE_DEPTH, NOTIFICATION_SEND_DURATION
+from shared.rate_limit import TokenBucket
+from shared.redis_client import get_async_redis, get_redis
+
+# Очередь сообщений к отправке (list) и отложенные сообщения (sorted set по времени)
+NOTIFICATION_QUEUE_KEY = "notifications:queue"
+NOTIFICATION_DELAYED_KEY = "notifications:delayed"
+# Строки уведомлений цикла мониторинга, ожидающие сборки в дайджесты (list)
+DIGEST_KEY = "notifications:digest:{}"
+# Циклы с неотправленными строками (sorted set: cycle_id -> время первой строки)
+DIGEST_PENDING_KEY = "notifications:digest:pending"
+_DIGEST_TTL_SECONDS = 24 * 3600
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+DIGEST_HEADER = "🔔 Изменения статуса ваших сайтов:"
+
+_BACKOFF_BASE_SECONDS = 1.0
+_BACKOFF_MAX_SECONDS = 60.0
+_QUEUE_DEPTH_INTERVAL_SECONDS = 5.0
+
+
+def _encode(chat_id: int, text: str) -> str:
+    # id делает одинаковые сообщения различимыми в sorted set отложенных
+    return json.dumps(
+        {"id": uuid.uuid4().hex, "chat_id": chat_id, "text": text, "attempt": 0},
+        ensure_ascii=False,
+    )
+
+
+def enqueue_notification(chat_id: int, text: str) -> None:
+    """Ставит уведомление в очередь; отправкой занимается NotificationDispatcher."""
+    get_redis().rpush(NOTIFICATION_QUEUE_KEY, _encode(chat_id, text))
+    logger.debug(f"Queued notification for {chat_id}")
+
+
+def enqueue_notifications(messages: Iterable[Tuple[int, str]]) -> int:
+    """Ставит в очередь набор пар (chat_id, text) одним pipeline."""
+    pipe = get_redis().pipeline(transaction=False)
+    count = 0
+    for chat_id, text in messages:
+        pipe.rpush(NOTIFICATION_QUEUE_KEY, _encode(chat_id, text))
+        count += 1
+    if count:
+        pipe.execute()
+        logger.debug(f"Queued {count} notifications")
+    return count
+
+
+# Разметка HTML сообщения: тег, сущность или текст между ними
+_HTML_TOKEN = re.compile(r"<[^>]*>|&#?\w+;|[^<&]+|[<&]")
+_HTML_TAG = re.compile(r"<(/?)(\w+)")
+
+
+def truncate_html(text: str, limit: int) -> str:
+    """Обрезает HTML-строку до ``limit`` символов, не разрывая теги и сущности.
+
+    Незакрытые теги закрываются, обрезка отмечается многоточием — иначе
+    Telegram отклонил бы всё сообщение (parse mode HTML).
+    """
+    if len(text) <= limit:
+        return text
+    pieces: List[str] = []
+    length = 0
+    open_tags: List[str] = []
+    for token in _HTML_TOKEN.findall(text):
+        tags = open_tags
+        tag = _HTML_TAG.match(token)
+        if tag:
+            closing, name = tag.groups()
+            tags = open_tags[:-1] if closing else open_tags + [name]
+        # Место под многоточие и закрывающие теги
+        budget = limit - length - 1 - sum(len(name) + 3 for name in tags)
+        if len(token) > budget:
+            if not tag and not token.startswith("&") and budget > 0:
+                pieces.append(token[:budget])
+            break
+        pieces.append(token)
+        length += len(token)
+        open_tags = tags
+    closing_tags = "".join(f"</{name}>" for name in reversed(open_tags))
+    return "".join(pieces) + "…" + closing_tags
+
+
+def build_digests(lines: List[str], limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Собирает строки одного получателя в сообщения не длиннее ``limit``.
+
+    Одна строка уходит как есть; несколько — с заголовком, а при превышении
+    лимита делятся на несколько сообщений по границам строк. Слишком длинная
+    строка обрезается ``truncate_html``.
+    """
+    if len(lines) == 1:
+        return [truncate_html(lines[0], limit)]
+    messages = []
+    current = DIGEST_HEADER
+    for line in lines:
+        line = truncate_html(line, limit - len(DIGEST_HEADER) - 1)
+        if len(current) + 1 + len(line) > limit:
+            messages.append(current)
+            current = DIGEST_HEADER
+        current += "\n" + line
+    messages.append(current)
+    return messages
+
+
+def enqueue_digests(items: Iterable[Tuple[int, str]]) -> int:
+    """Группирует пары (chat_id, строка) по получателю и ставит дайджесты в очередь."""
+    by_chat: Dict[int, List[str]] = defaultdict(list)
+    for chat_id, line in items:
+        by_chat[chat_id].append(line)
+    return enqueue_notifications(
+        (chat_id, message)
+        for chat_id, lines in by_chat.items()
+        for message in build_digests(lines)
+    )
+
+
+def stage_digest_items(cycle_id: str, items: Iterable[Tuple[int, str]]) -> int:
+    """Откладывает строки уведомлений до конца цикла (см. ``flush_digest``)."""
+    key = DIGEST_KEY.format(cycle_id)
+    pipe = get_redis().pipeline(transaction=False)
+    count = 0
+    for chat_id, line in items:
+        pipe.rpush(key, json.dumps([chat_id, line], ensure_ascii=False))
+        count += 1
+    if count:
+        pipe.expire(key, _DIGEST_TTL_SECONDS)
+        pipe.zadd(DIGEST_PENDING_KEY, {cycle_id: time.time()}, nx=True)
+        pipe.execute()
+    return count
+
+
+def flush_digest(cycle_id: str) -> int:
+    """Забирает строки цикла и ставит в очередь по дайджесту на получателя."""
+    key = DIGEST_KEY.format(cycle_id)
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.lrange(key, 0, -1)
+    pipe.delete(key)
+    pipe.zrem(DIGEST_PENDING_KEY, cycle_id)
+    raw_items, _, _ = pipe.execute()
+    if not raw_items:
+        return 0
+    queued = enqueue_digests(tuple(json.loads(item)) for item in raw_items)
+    logger.info(f"Coalesced {len(raw_items)} status changes into {queued} digests")
+    return queued
+
+
+def flush_stale_digests(max_age_seconds: int, now: Optional[float] = None) -> int:
+    """Отправляет дайджесты циклов, чей callback так и не выполнился.
+
+    Строки цикла, chord которого не завершился (ошибка брокера, потерянная
+    подзадача), иначе пролежали бы в Redis до истечения TTL.
+    """
+    now = now or time.time()
+    stale = get_redis().zrangebyscore(DIGEST_PENDING_KEY, "-inf", now - max_age_seconds)
+    queued = 0
+    for cycle_id in stale:
+        logger.warning(f"Flushing digests of unfinished monitoring cycle {cycle_id}")
+        queued += flush_digest(cycle_id)
+    return queued
+
+
+async def refresh_queue_depth(redis_client=None) -> Tuple[int, int]:
+    """Обновляет метрику глубины очереди: (готовые к отправке, отложенные)."""
+    redis_client = redis_client or get_async_redis()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.llen(NOTIFICATION_QUEUE_KEY)
+    pipe.zcard(NOTIFICATION_DELAYED_KEY)
+    ready, delayed = await pipe.execute()
+    NOTIFICATION_QUEUE_DEPTH.labels("ready").set(ready)
+    NOTIFICATION_QUEUE_DEPTH.labels("delayed").set(delayed)
+    return ready, delayed
+
+
+async def _error_body(response: aiohttp.ClientResponse) -> dict:
+    """JSON ответа Bot API с ошибкой; пустой dict, если тело не JSON-объект."""
+    try:
+        body = await response.json(content_type=None)
+    except (ValueError, aiohttp.ClientError) as e:
+        logger.warning(f"Unreadable Telegram error body (HTTP {response.status}): {e}")
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def _send_outcome(status: int) -> str:
+    if status == 200:
+        return "sent"
+    if status == 429:
+        return "rate_limited"
+    return "server_error" if status >= 500 else "rejected"
+
+
+class NotificationDispatcher:
+    """Асинхронно отправляет уведомления из очереди Redis в Telegram.
+
+    Соблюдает глобальный лимит бота и лимит на один чат, учитывает
+    ``retry_after`` из ответов 429, повторяет сетевые ошибки и 5xx
+    с экспоненциальной задержкой и переиспользует keep-alive соединения
+    общей HTTP-сессии процесса.
+    """
+
+    def __init__(self):
+        self._api_url = f"https://api.telegram.org/bot{settings.bot_token}/sendMessage"
+        self._global_bucket = TokenBucket(settings.telegram_global_rate_per_second)
+        self._chat_interval = 1.0 / settings.telegram_chat_rate_per_second
+        self._chat_next_send: Dict[int, float] = {}
+        self._paused_until = 0.0
+        self._semaphore = asyncio.Semaphore(settings.notification_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stopped = asyncio.Event()
+
+    async def run(self) -> None:
+        logger.info("Notification dispatcher started")
+        redis_client = get_async_redis()
+        tasks = set()
+        # Общая keep-alive сессия процесса (shared.http_client)
+        self._session = get_async_session()
+        depth_refreshed = 0.0
+        while not self._stopped.is_set():
+            try:
+                await self._promote_delayed(redis_client)
+                if time.monotonic() - depth_refreshed >= _QUEUE_DEPTH_INTERVAL_SECONDS:
+                    await refresh_queue_depth(redis_client)
+                    depth_refreshed = time.monotonic()
+                item = await redis_client.blpop(NOTIFICATION_QUEUE_KEY, timeout=1)
+                if not item:
+                    continue
+                payload = json.loads(item[1])
+                delay = self._delay_for(payload)
+                if delay > 0:
+                    # Лимит чата исчерпан — откладываем, не блокируя другие чаты
+                    await self._defer(redis_client, payload, delay)
+                    continue
+                await self._global_bucket.acquire()
+                await self._semaphore.acquire()
+                task = asyncio.create_task(self._send(redis_client, payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification dispatcher error: {e}", exc_info=True)
+                await asyncio.sleep(1)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Notification dispatcher stopped")
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _delay_for(self, payload: dict) -> float:
+        """Возвращает, через сколько секунд сообщение можно отправить.
+
+        Если чат занят, сообщению резервируется ближайший свободный слот
+        (флаг ``reserved``), и после задержки оно отправляется без повторной
+        проверки лимита чата.
+        """
+        now = time.monotonic()
+        if self._paused_until > now:
+            return self._paused_until - now
+        if payload.pop("reserved", False):
+            return 0.0
+        chat_id = payload["chat_id"]
+        slot = max(now, self._chat_next_send.get(chat_id, 0.0))
+        self._chat_next_send[chat_id] = slot + self._chat_interval
+        if len(self._chat_next_send) > 10000:
+            self._chat_next_send = {
+                chat: ts for chat, ts in self._chat_next_send.items() if ts > now
+            }
+        if slot > now:
+            payload["reserved"] = True
+        return slot - now
+
+    async def _defer(self, redis_client, payload: dict, delay: float) -> None:
+        await redis_client.zadd(
+            NOTIFICATION_DELAYED_KEY,
+            {json.dumps(payload, ensure_ascii=False): time.time() + delay},
+        )
+
+    async def _promote_delayed(self, redis_client) -> None:
+        now = time.time()
+        ready = await redis_client.zrangebyscore(NOTIFICATION_DELAYED_KEY, "-inf", now)
+        if not ready:
+            return
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.zremrangebyscore(NOTIFICATION_DELAYED_KEY, "-inf", now)
+        # В начало очереди: отложенные сообщения старше новых
+        pipe.lpush(NOTIFICATION_QUEUE_KEY, *reversed(ready))
+        await pipe.execute()
+
+    async def _send(self, redis_client, payload: dict) -> None:
+        chat_id = payload["chat_id"]
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            data = {"chat_id": chat_id, "text": payload["text"], "parse_mode": "HTML"}
+            async with self._session.post(
+                self._api_url, json=data, timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                outcome = _send_outcome(response.status)
+                if response.status == 200:
+                    logger.info(f"Notification sent successfully to {chat_id}")
+                    return
+                if response.status >= 500:
+                    # Тело 5xx может быть HTML-страницей прокси: не читаем
+                    await self._retry(redis_client, payload, f"HTTP {response.status}")
+                    return
+                body = await _error_body(response)
+                if response.status == 429:
+                    retry_after = (body.get("parameters") or {}).get("retry_after", 1)
+                    logger.warning(
+                        f"Telegram rate limit hit, pausing sends for {retry_after}s"
+                    )
+                    self._paused_until = time.monotonic() + retry_after
+                    await self._defer(redis_client, payload, retry_after)
+                    return
+                logger.error(
+                    f"Failed to send notification to {chat_id}: {body.get('description')}"
+                )
+                if "chat not found" in str(body.get("description", "")).lower():
+                    logger.warning(
+                        f"Chat with user {chat_id} not found. User may not have started the bot."
+                    )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            await self._retry(redis_client, payload, repr(e))
+        except Exception as e:
+            logger.error(
+                f"Unexpected error sending notification to {chat_id}: {e}",
+                exc_info=True,
+            )
+        finally:
+            NOTIFICATION_SEND_DURATION.labels(outcome).observe(
+                time.perf_counter() - started
+            )
+            self._semaphore.release()
+
+    async def _retry(self, redis_client, payload: dict, reason: str) -> None:
+        attempt = payload.get("attempt", 0) + 1
+        if attempt >= settings.notification_max_attempts:
+            logger.error(
+                f"Dropping notification to {payload['chat_id']} after {attempt} attempts: {reason}"
+            )
+            return
+        delay = min(_BACKOFF_MAX_SECONDS, _BACKOFF_BASE_SECONDS * 2**attempt)
+        delay *= random.uniform(0.5, 1.5)
+        logger.warning(
+            f"Retrying notification to {payload['chat_id']} in {delay:.1f}s "
+            f"(attempt {attempt}): {reason}"
+        )
+        await self._defer(redis_client, {**payload, "attempt": attempt}, delay)
@@ -0,0 +1,189 @@
+# shared/rate_limit.py
+import asyncio
+import ipaddress
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Dict, Optional, Tuple
+from shared.config import settings
+
+try:  # Список публичных суффиксов (снимок в пакете, без загрузки из сети)
+    import tldextract
+
+    _tld_extract = tldextract.TLDExtract(
+        suffix_list_urls=(), cache_dir=None, include_psl_private_domains=True
+    )
+except ImportError:  # pragma: no cover - зависит от окружения
+    _tld_extract = None
+
+# Публичные суффиксы, под которыми домены выдаются разным владельцам
+# (хостинги и национальные зоны): сайты user1.github.io и user2.github.io —
+# разные регистрируемые домены. Используется без tldextract
+_PUBLIC_SUFFIXES = {
+    # хостинги с поддоменами пользователей
+    "appspot.com", "azurewebsites.net", "blogspot.com", "cloudfront.net",
+    "fly.dev", "github.io", "gitlab.io", "glitch.me", "herokuapp.com",
+    "netlify.app", "onrender.com", "pages.dev", "readthedocs.io",
+    "vercel.app", "web.app", "firebaseapp.com", "workers.dev",
+    "s3.amazonaws.com", "ngrok.io", "ngrok-free.app",
+    # национальные зоны второго уровня
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "ltd.uk", "plc.uk", "me.uk",
+    "com.au", "net.au", "org.au", "edu.au", "gov.au",
+    "co.jp", "ne.jp", "or.jp", "ac.jp", "go.jp",
+    "co.nz", "org.nz", "net.nz", "co.za", "org.za", "co.in", "net.in",
+    "org.in", "co.kr", "or.kr", "com.br", "net.br", "org.br", "com.cn",
+    "net.cn", "org.cn", "com.tr", "com.mx", "com.ar", "com.ru", "net.ru",
+    "org.ru", "msk.ru", "spb.ru", "com.ua", "kiev.ua", "com.by",
+}  # fmt: skip
+# Метки второго уровня, под которыми регистрируют домены в национальных зонах
+# (example.co.uk, example.com.ru): регистрируемый домен — на уровень глубже
+_SECOND_LEVEL_LABELS = {
+    "ac", "co", "com", "edu", "gov", "go", "ltd", "mil", "ne", "net", "nic", "or",
+    "org", "plc", "sch",
+}  # fmt: skip
+# Предел числа доменов в ``DomainLimiter`` (при переполнении — сброс простаивающих)
+_MAX_DOMAINS = 10000
+
+
+class TokenBucket:
+    """Асинхронный token bucket: ``rate`` токенов в секунду, запас ``capacity``."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+def registrable_domain(host: str) -> str:
+    """Регистрируемый домен хоста: ``a.b.example.com`` -> ``example.com``.
+
+    С установленным ``tldextract`` — по списку публичных суффиксов (вместе
+    с частными: ``user.github.io``). Без него — по встроенному набору
+    ``_PUBLIC_SUFFIXES`` (самый длинный совпавший суффикс хоста), а для
+    остальных национальных зон — по меткам второго уровня вида ``co``.
+    IP-адреса возвращаются как есть.
+    """
+    host = host.rstrip(".").lower()
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    if _tld_extract is not None:
+        parts = _tld_extract(host)
+        if parts.domain and parts.suffix:
+            return f"{parts.domain}.{parts.suffix}"
+    labels = host.split(".")
+    for start in range(1, len(labels)):
+        if ".".join(labels[start:]) in _PUBLIC_SUFFIXES:
+            return ".".join(labels[start - 1 :])
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+class _DomainSlot:
+    __slots__ = ("semaphore", "bucket", "active")
+
+    def __init__(self, concurrency: int, rate: float, burst: float):
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self.bucket = TokenBucket(rate, burst or None) if rate > 0 else None
+        self.active = 0
+
+
+class DomainLimiter:
+    """Лимиты вежливости к проверяемым сайтам по регистрируемому домену.
+
+    На домен — не больше ``concurrency`` одновременных запросов и не чаще
+    ``rate`` запросов в секунду (token bucket с запасом ``burst``); 0 — без
+    ограничения. ``overrides`` задаёт для отдельных доменов свою пару
+    (concurrency, rate). Токен частоты берётся на каждый запрос проверки
+    (HEAD и повторный GET — два токена); переходы по редиректам отдельно
+    не учитываются. Лимиты действуют в пределах процесса: в пуле
+    prefork домен, чьи сайты попали в подзадачи разных процессов, получает
+    их сумму.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        overrides: Optional[Dict[str, Tuple[int, float]]] = None,
+    ):
+        self.concurrency = (
+            settings.check_domain_concurrency if concurrency is None else concurrency
+        )
+        self.rate = settings.check_domain_rate if rate is None else rate
+        self.burst = settings.check_domain_burst if burst is None else burst
+        self.overrides = (
+            settings.check_domain_limits if overrides is None else overrides
+        )
+        self._slots: Dict[str, _DomainSlot] = {}
+
+    def limits(self, domain: str) -> Tuple[int, float]:
+        return self.overrides.get(domain, (self.concurrency, self.rate))
+
+    def _slot(self, domain: str) -> _DomainSlot:
+        slot = self._slots.get(domain)
+        if slot is None:
+            if len(self._slots) >= _MAX_DOMAINS:
+                # Домены без запросов в работе: их запас токенов просто
+                # восстановится до полного
+                self._slots = {
+                    name: slot for name, slot in self._slots.items() if slot.active
+                }
+            slot = _DomainSlot(*self.limits(domain), self.burst)
+            self._slots[domain] = slot
+        return slot
+
+    async def acquire(self, host: str) -> None:
+        """Ещё один запрос внутри уже занятого ``limit(host)``: только токен
+        частоты, место в лимите одновременных запросов не занимается повторно."""
+        slot = self._slot(registrable_domain(host))
+        if slot.bucket is not None:
+            await slot.bucket.acquire()
+
+    @asynccontextmanager
+    async def limit(self, host: str):
+        """``async with limiter.limit(host):`` — запрос в пределах лимитов домена."""
+        slot = self._slot(registrable_domain(host))
+        slot.active += 1
+        try:
+            async with slot.semaphore or nullcontext():
+                if slot.bucket is not None:
+                    await slot.bucket.acquire()
+                yield
+        finally:
+            slot.active -= 1
+
+
+_domain_limiter: Optional[DomainLimiter] = None
+_domain_limiter_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_domain_limiter() -> DomainLimiter:
+    """Общий ``DomainLimiter`` текущего event loop: лимиты действуют на все
+    проверки процесса, а не на отдельный движок."""
+    global _domain_limiter, _domain_limiter_loop
+    loop = asyncio.get_running_loop()
+    if _domain_limiter is None or _domain_limiter_loop is not loop:
+        _domain_limiter = DomainLimiter()
+        _domain_limiter_loop = loop
+    return _domain_limiter
@@ -0,0 +1,48 @@
+# shared/redis_client.py
+import redis
+import redis.asyncio as aioredis
+from typing import Optional
+from shared.config import settings
+
+_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """Возвращает общий клиент Redis для данных приложения.
+
+    Используется отдельная БД (``REDIS_CACHE_DB``), чтобы ключи приложения
+    не смешивались с очередями брокера и результатами Celery.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_cache_db,
+            decode_responses=True,
+            socket_connect_timeout=5,
+            socket_timeout=5,
+        )
+    return _client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Асинхронный аналог ``get_redis`` для кода, работающего в event loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_cache_db,
+            decode_responses=True,
+            socket_connect_timeout=5,
+        )
+    return _async_client
+
+
+def reset_after_fork() -> None:
+    """Дочерний процесс воркера открывает собственные соединения с Redis."""
+    global _client, _async_client
+    _client = None
+    _async_client = None
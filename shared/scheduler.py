@@ -0,0 +1,111 @@
+# shared/scheduler.py
+import time
+from typing import Dict, List, Optional
+from sqlalchemy.future import select
+from shared.config import settings
+from shared.logger_setup import logger
+from shared.models import Site
+from shared.redis_client import get_async_redis, get_redis
+
+# Индекс времени следующей проверки: sorted set (site_id -> unix-время)
+DUE_INDEX_KEY = "monitoring:due"
+# Метка последней пересинхронизации индекса с таблицей sites
+DUE_INDEX_SYNCED_KEY = "monitoring:due:synced"
+# Блокировка тика, чтобы затянувшийся тик не пересекался со следующим
+TICK_LOCK_KEY = "monitoring:tick:lock"
+
+_DB_BATCH_SIZE = 5000
+
+
+def sync_due_index(now: Optional[float] = None) -> int:
+    """Добавляет в индекс сайты, которых в нём ещё нет (сразу к проверке).
+
+    Существующие оценки не трогаются (``ZADD NX``), поэтому пересинхронизация
+    не сбивает расписание. Удалённые сайты вычищаются в ``claim_due_sites``.
+    """
+    from shared.db import SyncSessionFactory
+
+    now = now or time.time()
+    client = get_redis()
+    added = 0
+    with SyncSessionFactory() as session:
+        result = session.execute(
+            select(Site.id).execution_options(yield_per=_DB_BATCH_SIZE)
+        )
+        for partition in result.scalars().partitions():
+            added += client.zadd(
+                DUE_INDEX_KEY, {site_id: now for site_id in partition}, nx=True
+            )
+    client.set(DUE_INDEX_SYNCED_KEY, int(now), ex=settings.scheduler_resync_seconds)
+    logger.info(f"Due index synced with database: {added} new sites scheduled")
+    return added
+
+
+async def schedule_site_now(site_id: int) -> None:
+    """Ставит новый сайт в индекс сразу к проверке, не дожидаясь пересинхронизации."""
+    try:
+        await get_async_redis().zadd(DUE_INDEX_KEY, {site_id: time.time()}, nx=True)
+    except Exception as e:
+        # Сайт всё равно попадёт в индекс при следующей пересинхронизации
+        logger.error(f"Failed to schedule site {site_id}: {e}")
+
+
+def ensure_due_index(now: Optional[float] = None) -> None:
+    """Пересинхронизирует индекс, если истёк период ``SCHEDULER_RESYNC_SECONDS``."""
+    if not get_redis().exists(DUE_INDEX_SYNCED_KEY):
+        sync_due_index(now)
+
+
+def _get_site_intervals(site_ids: List[int]) -> Dict[int, Optional[int]]:
+    from shared.db import SyncSessionFactory
+
+    intervals = {}
+    with SyncSessionFactory() as session:
+        for start in range(0, len(site_ids), _DB_BATCH_SIZE):
+            batch = site_ids[start : start + _DB_BATCH_SIZE]
+            result = session.execute(
+                select(Site.id, Site.check_interval_seconds).filter(Site.id.in_(batch))
+            )
+            intervals.update({row.id: row.check_interval_seconds for row in result})
+    return intervals
+
+
+def claim_due_sites(
+    default_interval_seconds: int, now: Optional[float] = None
+) -> List[int]:
+    """Забирает сайты, чьё время проверки наступило, и переносит их срок.
+
+    Следующее время проверки — ``now`` плюс индивидуальный интервал сайта
+    (или ``default_interval_seconds``). Сайты, которых уже нет в БД,
+    удаляются из индекса. Возвращает отсортированные id сайтов к проверке.
+    """
+    now = now or time.time()
+    client = get_redis()
+    due_ids = [
+        int(site_id) for site_id in client.zrangebyscore(DUE_INDEX_KEY, "-inf", now)
+    ]
+    if not due_ids:
+        return []
+    intervals = _get_site_intervals(due_ids)
+    pipe = client.pipeline(transaction=False)
+    claimed = []
+    for site_id in due_ids:
+        if site_id not in intervals:
+            pipe.zrem(DUE_INDEX_KEY, site_id)
+            continue
+        interval = intervals[site_id] or default_interval_seconds
+        pipe.zadd(DUE_INDEX_KEY, {site_id: now + interval}, xx=True)
+        claimed.append(site_id)
+    pipe.execute()
+    removed = len(due_ids) - len(claimed)
+    if removed:
+        logger.info(f"Removed {removed} deleted sites from due index")
+    return sorted(claimed)
+
+
+def acquire_tick_lock(ttl_seconds: int) -> bool:
+    return bool(get_redis().set(TICK_LOCK_KEY, "1", nx=True, ex=ttl_seconds))
+
+
+def release_tick_lock() -> None:
+    get_redis().delete(TICK_LOCK_KEY)
@@ -11,6 +11,8 @@ class SiteBase(BaseModel):
     is_available: bool
     last_checked: Optional[datetime] = None
     last_notified: Optional[datetime] = None
+    check_interval_seconds: Optional[int] = None
+    check_type: str = "http"
 
 
 class Site(SiteBase):
@@ -19,3 +21,13 @@ class Site(SiteBase):
 
     class Config:
         from_attributes = True  # Updated from orm_mode
+
+
+class SiteUptime(BaseModel):
+    site_id: int
+    url: str
+    start: datetime
+    end: datetime
+    checks: int
+    failures: int
+    uptime_percent: Optional[float] = None  # None — в окне не было проверок
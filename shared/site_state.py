@@ -0,0 +1,150 @@
+# shared/site_state.py
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from shared.config import settings
+from shared.redis_client import get_redis
+
+# Состояние автомата сайта: hash site_state:{site_id}
+SITE_STATE_KEY = "site_state:{}"
+_STATE_TTL_SECONDS = 7 * 24 * 3600
+
+NOTIFY_STATUS = "status"
+NOTIFY_FLAPPING = "flapping"
+NOTIFY_SETTLED = "settled"
+
+
+def _alerted_key(is_available: bool) -> str:
+    """Поле состояния: время последнего уведомления о статусе ``is_available``."""
+    return "up_alerted" if is_available else "down_alerted"
+
+
+@dataclass
+class Decision:
+    """Итог наблюдения: подтверждённый статус и что отправить пользователю."""
+
+    confirmed: bool
+    changed: bool
+    flapping: bool
+    # NOTIFY_STATUS | NOTIFY_FLAPPING | NOTIFY_SETTLED | None
+    notify: Optional[str] = None
+
+
+class SiteStateMachine:
+    """Подтверждение смены статуса, детектор «мигания» и cooldown уведомлений.
+
+    Подтверждённый статус — ``Site.is_available`` в БД; он меняется только
+    после ``STATUS_DOWN_THRESHOLD`` неудачных (или ``STATUS_UP_THRESHOLD``
+    успешных) проверок подряд. Если за ``FLAP_WINDOW_SECONDS`` сырой результат
+    менялся ``FLAP_THRESHOLD`` раз, сайт считается «мигающим»: пользователь
+    получает одно уведомление о нестабильности. «Мигание» заканчивается после
+    ``FLAP_SETTLE_CHECKS`` одинаковых результатов подряд; тогда пользователь,
+    получивший уведомление о нестабильности, узнаёт текущий статус
+    (``NOTIFY_SETTLED``).
+
+    ``NOTIFICATION_COOLDOWN_SECONDS`` ограничивает только повторы: уведомления
+    об одном и том же статусе (повторное «недоступен») и уведомления
+    о нестабильности. Первое восстановление после подтверждённого сбоя,
+    первое уведомление о нестабильности и итоговый статус уходят сразу;
+    отложенное повторное уведомление отправится при первой проверке после
+    истечения cooldown.
+
+    Счётчики хранятся в Redis и читаются/пишутся одним pipeline на пачку.
+    """
+
+    def __init__(self, now: Optional[float] = None):
+        self.now = now or time.time()
+        self._states: Dict[int, dict] = {}
+
+    def load(self, site_ids: Iterable[int]) -> None:
+        site_ids = list(site_ids)
+        pipe = get_redis().pipeline(transaction=False)
+        for site_id in site_ids:
+            pipe.hgetall(SITE_STATE_KEY.format(site_id))
+        for site_id, fields in zip(site_ids, pipe.execute()):
+            self._states[site_id] = {key: float(value) for key, value in fields.items()}
+
+    def save(self) -> None:
+        if not self._states:
+            return
+        pipe = get_redis().pipeline(transaction=False)
+        for site_id, state in self._states.items():
+            key = SITE_STATE_KEY.format(site_id)
+            pipe.hset(key, mapping=state)
+            pipe.expire(key, _STATE_TTL_SECONDS)
+        pipe.execute()
+
+    def _cooldown_passed(self, alerted_at: Optional[float]) -> bool:
+        if alerted_at is None:
+            return True
+        return self.now - alerted_at >= settings.notification_cooldown_seconds
+
+    def observe(
+        self,
+        site_id: int,
+        confirmed: bool,
+        observed: bool,
+        last_notified: Optional[datetime],
+    ) -> Decision:
+        state = self._states.setdefault(site_id, {})
+        # Какой статус пользователь видел последним; без записи — статус из БД,
+        # о котором он узнал в Site.last_notified
+        if "notified" not in state and last_notified is not None:
+            state[_alerted_key(confirmed)] = last_notified.timestamp()
+        notified = bool(state.get("notified", confirmed))
+        # Сырые результаты: длина серии и число смен в окне детектора
+        if state.get("observed") == observed:
+            state["streak"] = state.get("streak", 0) + 1
+        else:
+            if "observed" in state:
+                if (
+                    self.now - state.get("window_start", 0)
+                    > settings.flap_window_seconds
+                ):
+                    state["window_start"] = self.now
+                    state["flips"] = 0
+                state["flips"] = state.get("flips", 0) + 1
+            state["streak"] = 1
+            state["observed"] = float(observed)
+        if self.now - state.get("window_start", 0) > settings.flap_window_seconds:
+            state["flips"] = 0
+        if (
+            state.get("flips", 0) >= settings.flap_threshold
+            and state["streak"] >= settings.flap_settle_checks
+        ):
+            # Серия одинаковых результатов: сайт успокоился, окно начинается заново
+            state["flips"] = 0
+            state["window_start"] = self.now
+        threshold = (
+            settings.status_up_threshold if observed else settings.status_down_threshold
+        )
+        changed = observed != confirmed and state["streak"] >= threshold
+        if changed:
+            confirmed = observed
+        flapping = state.get("flips", 0) >= settings.flap_threshold
+        decision = Decision(confirmed, changed, flapping)
+        if flapping:
+            # "flapping" — отправлено уведомление о нестабильности
+            if not state.get("flapping") and self._cooldown_passed(
+                state.get("flapping_alerted")
+            ):
+                decision.notify = NOTIFY_FLAPPING
+                state["flapping"] = 1.0
+                state["flapping_alerted"] = self.now
+        elif state.get("flapping"):
+            # После уведомления о нестабильности — итоговый статус, даже если
+            # он совпадает с последним отправленным
+            decision.notify = NOTIFY_SETTLED
+            state["flapping"] = 0.0
+            notified = confirmed
+            state[_alerted_key(confirmed)] = self.now
+        elif confirmed != notified and self._cooldown_passed(
+            state.get(_alerted_key(confirmed))
+        ):
+            # Cooldown — только от прошлого уведомления о том же статусе
+            decision.notify = NOTIFY_STATUS
+            notified = confirmed
+            state[_alerted_key(confirmed)] = self.now
+        state["notified"] = float(notified)
+        return decision
@@ -0,0 +1,169 @@
+# shared/status_cache.py
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+from shared.config import settings
+from shared.logger_setup import logger
+from shared.redis_client import get_async_redis, get_redis
+from shared.schemas import Site as SiteSchema
+
+# Текущее состояние сайта: hash site_status:{site_id} (поля — колонки SiteBase)
+SITE_STATUS_KEY = "site_status:{}"
+# Список сайтов пользователя: set user_sites:{user_id} из id сайтов
+USER_SITES_KEY = "user_sites:{}"
+# Соответствие telegram_id -> users.id для чтения списка из бота
+TELEGRAM_USER_KEY = "telegram_user:{}"
+# Время последней проверки каждого сайта: sorted set (site_id -> unix-время).
+# В режиме STATUS_PERSIST_MODE=transitions это основной источник last_checked.
+LAST_CHECKED_KEY = "site_last_checked"
+# Элемент-метка в user_sites: отличает «сайтов нет» от «список не загружен»
+_LOADED_MARKER = "0"
+
+_FIELDS = (
+    "id",
+    "url",
+    "user_id",
+    "is_available",
+    "last_checked",
+    "last_notified",
+    "check_interval_seconds",
+    "check_type",
+)
+
+
+def _encode(site) -> dict:
+    """Поля сайта (ORM-объект, схема или словарь) для HSET."""
+    encoded = {}
+    for field in _FIELDS:
+        value = site[field] if isinstance(site, dict) else getattr(site, field)
+        if isinstance(value, bool):
+            value = int(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        encoded[field] = "" if value is None else value
+    return encoded
+
+
+def _decode(fields: dict) -> Optional[SiteSchema]:
+    if any(field not in fields for field in _FIELDS):
+        return None  # Неполная запись — считаем промахом
+    return SiteSchema(
+        id=int(fields["id"]),
+        url=fields["url"],
+        user_id=int(fields["user_id"]),
+        is_available=fields["is_available"] == "1",
+        last_checked=fields["last_checked"] or None,
+        last_notified=fields["last_notified"] or None,
+        check_interval_seconds=(
+            int(fields["check_interval_seconds"])
+            if fields["check_interval_seconds"]
+            else None
+        ),
+        check_type=fields["check_type"],
+    )
+
+
+def cache_site_statuses(sites: Iterable) -> int:
+    """Записывает состояние сайтов одним pipeline (используется воркерами).
+
+    ``sites`` — объекты или словари с полями ``_FIELDS``. Время проверки
+    заодно попадает в ``LAST_CHECKED_KEY`` одним ``ZADD`` на пачку.
+    """
+    pipe = get_redis().pipeline(transaction=False)
+    last_checked = {}
+    count = 0
+    for site in sites:
+        count += 1
+        fields = _encode(site)
+        key = SITE_STATUS_KEY.format(fields["id"])
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, settings.status_cache_ttl_seconds)
+        checked_at = (
+            site["last_checked"] if isinstance(site, dict) else site.last_checked
+        )
+        if checked_at is not None:
+            last_checked[fields["id"]] = checked_at.timestamp()
+    if last_checked:
+        pipe.zadd(LAST_CHECKED_KEY, last_checked)
+    if count:
+        pipe.execute()
+    return count
+
+
+async def get_cached_user_id(telegram_id: int) -> Optional[int]:
+    user_id = await get_async_redis().get(TELEGRAM_USER_KEY.format(telegram_id))
+    return int(user_id) if user_id else None
+
+
+async def get_cached_user_sites(user_id: int) -> Optional[List[SiteSchema]]:
+    """Сайты пользователя из кэша или ``None``, если чего-то не хватает."""
+    client = get_async_redis()
+    members = await client.smembers(USER_SITES_KEY.format(user_id))
+    if not members:
+        return None
+    site_ids = sorted(int(member) for member in members if member != _LOADED_MARKER)
+    if not site_ids:
+        return []
+    pipe = client.pipeline(transaction=False)
+    for site_id in site_ids:
+        pipe.hgetall(SITE_STATUS_KEY.format(site_id))
+    sites = [_decode(fields) for fields in await pipe.execute()]
+    if any(site is None for site in sites):
+        return None
+    return sites
+
+
+async def cache_user_sites(
+    user_id: int, sites: Iterable, telegram_id: Optional[int] = None
+) -> List[SiteSchema]:
+    """Кладёт в кэш список сайтов пользователя, прочитанный из Postgres.
+
+    ``last_checked`` берётся из ``LAST_CHECKED_KEY``, если там значение новее:
+    в режиме transitions колонка в БД обновляется только при смене статуса.
+    """
+    sites = [SiteSchema.model_validate(site) for site in sites]
+    client = get_async_redis()
+    if sites:
+        scores = await client.zmscore(LAST_CHECKED_KEY, [site.id for site in sites])
+        for site, score in zip(sites, scores):
+            if score is None:
+                continue
+            checked_at = datetime.fromtimestamp(score, tz=timezone.utc)
+            if site.last_checked is None or checked_at > site.last_checked:
+                site.last_checked = checked_at
+    ttl = settings.status_cache_ttl_seconds
+    index_key = USER_SITES_KEY.format(user_id)
+    pipe = client.pipeline(transaction=True)
+    for site in sites:
+        key = SITE_STATUS_KEY.format(site.id)
+        pipe.hset(key, mapping=_encode(site))
+        pipe.expire(key, ttl)
+    pipe.delete(index_key)
+    pipe.sadd(index_key, _LOADED_MARKER, *(site.id for site in sites))
+    pipe.expire(index_key, ttl)
+    if telegram_id is not None:
+        pipe.set(TELEGRAM_USER_KEY.format(telegram_id), user_id, ex=ttl)
+    await pipe.execute()
+    return sites
+
+
+async def invalidate_user_sites(user_id: int, site_id: Optional[int] = None) -> None:
+    """Сбрасывает список сайтов пользователя (и запись сайта) после изменений."""
+    keys = [USER_SITES_KEY.format(user_id)]
+    if site_id is not None:
+        keys.append(SITE_STATUS_KEY.format(site_id))
+    try:
+        await get_async_redis().delete(*keys)
+    except Exception as e:
+        # Без сброса список устареет до истечения TTL — только логируем
+        logger.error(f"Failed to invalidate status cache for user {user_id}: {e}")
+
+
+async def forget_site(user_id: int, site_id: int) -> None:
+    """Удаляет из кэша всё о сайте (после удаления сайта из БД)."""
+    try:
+        pipe = get_async_redis().pipeline(transaction=False)
+        pipe.delete(USER_SITES_KEY.format(user_id), SITE_STATUS_KEY.format(site_id))
+        pipe.zrem(LAST_CHECKED_KEY, site_id)
+        await pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to drop site {site_id} from status cache: {e}")
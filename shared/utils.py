@@ -1,4 +1,3 @@
-import requests
 import time
 import redis
 from bot.celery_app import celery_app  # Убедитесь, что импорт корректен
@@ -7,50 +6,6 @@ from shared.config import settings
 from redis.exceptions import ConnectionError, TimeoutError
 
 
-def check_website_sync(
-    url: str, retries: int = 3, delay: int = 2, timeout: int = 5
-) -> bool:
-    logger.debug(f"Starting check for site: {url}")
-    headers = {"User-Agent": "WebsiteMonitorBot/1.0 (Sync Check)"}
-    for attempt in range(retries):
-        try:
-            response = requests.get(
-                url, headers=headers, timeout=timeout, allow_redirects=True
-            )
-            is_available = 200 <= response.status_code < 400
-            logger.info(
-                f"{url} — {'available' if is_available else 'unavailable'} "
-                f"(status: {response.status_code}, attempt {attempt + 1})"
-            )
-            return is_available
-        except requests.RequestException as e:
-            logger.warning(f"Error checking {url} (attempt {attempt + 1}): {e}")
-            if attempt < retries - 1:
-                time.sleep(delay)
-    logger.warning(f"Site {url} unavailable after {retries} attempts.")
-    return False
-
-
-def send_notification_sync(user_id: int, message: str) -> None:
-    logger.debug(f"Attempting to send sync notification to {user_id}")
-    url = f"https://api.telegram.org/bot{settings.bot_token}/sendMessage"
-    payload = {"chat_id": user_id, "text": message, "parse_mode": "HTML"}
-    try:
-        response = requests.post(url, json=payload, timeout=5)
-        if response.status_code == 200:
-            logger.info(f"Sync notification sent successfully to {user_id}")
-        else:
-            logger.error(f"Failed to send sync message to {user_id}: {response.text}")
-            if "chat not found" in response.text.lower():
-                logger.warning(
-                    f"Chat with user {user_id} not found. User may not have started the bot."
-                )
-    except requests.RequestException as e:
-        logger.error(f"Failed to send sync message to {user_id}: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error sending sync message to {user_id}: {e}")
-
-
 def publish_celery_task(
     task_name: str, args: list, retries: int = 3, delay: int = 5
 ) -> bool:
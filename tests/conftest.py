@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+
+# shared.config требует обязательные настройки бота
+os.environ.setdefault("BOT_TOKEN", "test-token")
+os.environ.setdefault("ADMIN_CHAT_ID", "1")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
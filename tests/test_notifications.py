@@ -0,0 +1,45 @@
+# tests/test_notifications.py
+import re
+from shared.notifications import DIGEST_HEADER, build_digests, truncate_html
+
+
+def _valid_html(text: str) -> bool:
+    """Теги парные и вложены правильно, обрывков тегов и сущностей нет."""
+    stack = []
+    for closing, name in re.findall(r"<(/?)(\w+)[^>]*>", text):
+        if closing:
+            if not stack or stack.pop() != name:
+                return False
+        else:
+            stack.append(name)
+    plain = re.sub(r"<[^>]*>|&#?\w+;", "", text)
+    return not stack and "<" not in plain and "&" not in plain
+
+
+def test_truncate_html_keeps_short_text():
+    assert truncate_html("<b>ok</b>", 20) == "<b>ok</b>"
+
+
+def test_truncate_html_never_splits_tags_or_entities():
+    text = "❌ Статус сайта <b>https://" + "a" * 50 + "&amp;x</b> изменился"
+    for limit in range(5, len(text)):
+        result = truncate_html(text, limit)
+        assert len(result) <= limit
+        assert _valid_html(result), result
+
+
+def test_build_digests_splits_on_line_boundaries():
+    lines = [
+        f"✅ Статус сайта <b>https://site-{i}.example</b> изменился" for i in range(200)
+    ]
+    messages = build_digests(lines, limit=500)
+    assert all(len(message) <= 500 for message in messages)
+    assert all(message.startswith(DIGEST_HEADER) for message in messages)
+    assert sum(len(message.split("\n")) - 1 for message in messages) == len(lines)
+
+
+def test_build_digests_truncates_long_single_line_as_html():
+    line = "<b>" + "x" * 5000 + "</b>"
+    (message,) = build_digests([line])
+    assert len(message) <= 4096
+    assert message.endswith("…</b>")
@@ -0,0 +1,91 @@
+# tests/test_site_state.py
+from datetime import datetime, timezone
+import fakeredis
+import pytest
+from shared import site_state
+from shared.config import settings
+from shared.site_state import (
+    NOTIFY_FLAPPING,
+    NOTIFY_SETTLED,
+    NOTIFY_STATUS,
+    SiteStateMachine,
+)
+
+SITE_ID = 1
+START = 1_000_000.0
+STEP = 60
+
+server = fakeredis.FakeServer()
+
+
+@pytest.fixture(autouse=True)
+def state_settings(monkeypatch):
+    monkeypatch.setattr(
+        site_state,
+        "get_redis",
+        lambda: fakeredis.FakeRedis(server=server, decode_responses=True),
+    )
+    for name, value in {
+        "status_down_threshold": 2,
+        "status_up_threshold": 1,
+        "flap_window_seconds": 3600,
+        "flap_threshold": 5,
+        "flap_settle_checks": 3,
+        "notification_cooldown_seconds": 900,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+
+@pytest.fixture(autouse=True)
+def clean_redis():
+    fakeredis.FakeRedis(server=server).flushall()
+
+
+def replay(sequence: str, confirmed: bool = True):
+    """Прогоняет серию сырых результатов (T/F) с шагом STEP, как цикл мониторинга.
+
+    Возвращает [(секунда от начала, тип уведомления, подтверждённый статус)].
+    """
+    last_notified = None
+    sent = []
+    for index, result in enumerate(sequence):
+        now = START + index * STEP
+        machine = SiteStateMachine(now)
+        machine.load([SITE_ID])
+        decision = machine.observe(SITE_ID, confirmed, result == "T", last_notified)
+        machine.save()
+        confirmed = decision.confirmed
+        if decision.notify:
+            last_notified = datetime.fromtimestamp(now, tz=timezone.utc)
+            sent.append((index * STEP, decision.notify, decision.confirmed))
+    return sent
+
+
+def test_recovery_after_outage_is_not_delayed_by_cooldown():
+    assert replay("FFTTT") == [
+        (60, NOTIFY_STATUS, False),
+        (120, NOTIFY_STATUS, True),
+    ]
+
+
+def test_flapping_notice_is_sent_right_after_status_alerts():
+    assert replay("FFTFTFTFTTTT") == [
+        (60, NOTIFY_STATUS, False),
+        (120, NOTIFY_STATUS, True),
+        (360, NOTIFY_FLAPPING, True),
+        (600, NOTIFY_SETTLED, True),
+    ]
+
+
+def test_repeated_alert_in_same_direction_waits_for_cooldown():
+    # Второй сбой через 3 минуты после первого: повтор «недоступен» ждёт cooldown
+    sent = replay("FFTTFF" + "F" * 14)
+    assert sent == [
+        (60, NOTIFY_STATUS, False),
+        (120, NOTIFY_STATUS, True),
+        (960, NOTIFY_STATUS, False),
+    ]
+
+
+def test_settle_without_flapping_notice_sends_nothing_extra():
+    assert replay("TTTTT") == []
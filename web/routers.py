@@ -1,22 +1,30 @@
-from fastapi import APIRouter, Request, HTTPException, status, Depends, Form
+from fastapi import APIRouter, Request, HTTPException, status, Depends, Form, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from shared.db import (
     get_all_users_admin,
     get_user_sites_admin,
     delete_site_admin,
+    set_site_check_interval_admin,
+    set_site_check_type_admin,
     get_user_by_id_admin,
     AsyncSessionFactory,
     get_system_setting,
     set_system_setting,
+    get_sites_uptime,
+    resolve_uptime_window,
 )
 from web.auth import login_required, get_current_user
 from shared.logger_setup import logger
 from shared.models import Site, User
-from shared.schemas import Site as SiteSchema
-from typing import List
+from shared.schemas import Site as SiteSchema, SiteUptime
+from typing import List, Optional
 from sqlalchemy.future import select
-from shared.utils import check_website_sync, send_notification_sync, publish_celery_task
+from shared.utils import publish_celery_task
+from shared.monitoring import CHECK_TYPES, check_website_async, probe_target
+from shared.notifications import enqueue_notifications
+from shared.latency import get_latency_percentiles_async
+from shared.status_cache import invalidate_user_sites
 from shared.config import settings
 from datetime import datetime, timezone
 
@@ -58,8 +66,22 @@ async def get_user_sites_page(
         raise HTTPException(status_code=404, detail="User not found")
     sites = await get_user_sites_admin(user_id)
     logger.debug(f"Sites for user {user_id}: {sites}")
+    try:
+        latencies = await get_latency_percentiles_async(site.id for site in sites)
+    except Exception as e:
+        logger.error(f"Failed to load latency percentiles: {e}", exc_info=True)
+        latencies = {}
     return templates.TemplateResponse(
-        "user_sites.html", {"request": request, "sites": sites, "user": user}
+        "user_sites.html",
+        {
+            "request": request,
+            "sites": sites,
+            "user": user,
+            "latencies": latencies,
+            "latency_window_hours": settings.latency_window_hours,
+            "min_interval_seconds": settings.scheduler_tick_seconds,
+            "check_types": CHECK_TYPES,
+        },
     )
 
 
@@ -74,6 +96,62 @@ async def delete_site(site_id: int, current_user: str = Depends(login_required))
     )
 
 
+@router.post("/sites/{site_id}/interval")
+async def update_site_interval(
+    site_id: int,
+    check_interval_seconds: str = Form(""),
+    current_user: str = Depends(login_required),
+):
+    """Задаёт интервал проверки сайта; пустое значение — глобальный интервал."""
+    interval = None
+    if check_interval_seconds.strip():
+        try:
+            interval = int(check_interval_seconds)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Interval must be an integer")
+        if interval < settings.scheduler_tick_seconds:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Interval must be at least {settings.scheduler_tick_seconds} seconds",
+            )
+    logger.info(
+        f"Admin '{current_user}' setting check interval of site ID {site_id} to {interval}"
+    )
+    user_id = await set_site_check_interval_admin(site_id, interval)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Site not found")
+    return RedirectResponse(
+        url=f"/users/{user_id}", status_code=status.HTTP_303_SEE_OTHER
+    )
+
+
+@router.post("/sites/{site_id}/check_type")
+async def update_site_check_type(
+    site_id: int,
+    check_type: str = Form(...),
+    current_user: str = Depends(login_required),
+):
+    """Меняет тип проверки: HTTP-запрос, TCP connect или TLS-рукопожатие."""
+    if check_type not in CHECK_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Check type must be one of: {', '.join(CHECK_TYPES)}",
+        )
+    logger.info(
+        f"Admin '{current_user}' setting check type of site ID {site_id} to {check_type}"
+    )
+    try:
+        user_id = await set_site_check_type_admin(site_id, check_type)
+    except ValueError as e:
+        # Тип не подходит к адресу сайта (например, http для tcp://хост:порт)
+        raise HTTPException(status_code=400, detail=str(e))
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Site not found")
+    return RedirectResponse(
+        url=f"/users/{user_id}", status_code=status.HTTP_303_SEE_OTHER
+    )
+
+
 @router.post("/sites/{site_id}/refresh")
 async def refresh_site(site_id: int, current_user: str = Depends(login_required)):
     logger.info(f"Admin '{current_user}' attempting to refresh site ID {site_id}")
@@ -83,10 +161,13 @@ async def refresh_site(site_id: int, current_user: str = Depends(login_required)
             site = result.scalars().first()
             if not site:
                 raise HTTPException(status_code=404, detail="Site not found")
-            is_available = check_website_sync(site.url)
+            is_available = await check_website_async(
+                probe_target(site.url, site.check_type), check_type=site.check_type
+            )
             site.is_available = is_available
             site.last_checked = datetime.now(timezone.utc)
             await session.commit()
+            await invalidate_user_sites(site.user_id, site.id)
             logger.info(f"Site {site_id} refreshed: is_available={is_available}")
             return RedirectResponse(
                 url=f"/users/{site.user_id}", status_code=status.HTTP_303_SEE_OTHER
@@ -202,8 +283,9 @@ async def send_broadcast(
                     "current_user": current_user,
                 },
             )
-        for telegram_id in telegram_ids:
-            send_notification_sync(telegram_id, broadcast_message)
+        enqueue_notifications(
+            (telegram_id, broadcast_message) for telegram_id in telegram_ids
+        )
         logger.info(
             f"Sent broadcast message to {len(telegram_ids)} users by {current_user}"
         )
@@ -235,3 +317,48 @@ async def get_user_sites_api(user_id: int, current_user: str = Depends(login_req
         raise HTTPException(status_code=404, detail="User not found")
     sites = await get_user_sites_admin(user_id)
     return sites
+
+
+def _uptime_window(
+    window: str, start: Optional[datetime], end: Optional[datetime]
+) -> tuple:
+    try:
+        return resolve_uptime_window(window if start is None else None, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/api/sites/{site_id}/uptime", response_model=SiteUptime)
+async def get_site_uptime_api(
+    site_id: int,
+    window: str = Query("24h", description="24h, 7d или 30d"),
+    start: Optional[datetime] = Query(None, description="Начало произвольного окна"),
+    end: Optional[datetime] = Query(
+        None, description="Конец окна, по умолчанию сейчас"
+    ),
+    current_user: str = Depends(login_required),
+):
+    """Доступность сайта за окно (с точностью до часа) по агрегатам проверок."""
+    window_start, window_end = _uptime_window(window, start, end)
+    rows = await get_sites_uptime(window_start, window_end, site_id=site_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Site not found")
+    return rows[0]
+
+
+@router.get("/api/users/{user_id}/uptime", response_model=List[SiteUptime])
+async def get_user_uptime_api(
+    user_id: int,
+    window: str = Query("24h", description="24h, 7d или 30d"),
+    start: Optional[datetime] = Query(None, description="Начало произвольного окна"),
+    end: Optional[datetime] = Query(
+        None, description="Конец окна, по умолчанию сейчас"
+    ),
+    current_user: str = Depends(login_required),
+):
+    """SLA всех сайтов пользователя одним запросом."""
+    user = await get_user_by_id_admin(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    window_start, window_end = _uptime_window(window, start, end)
+    return await get_sites_uptime(window_start, window_end, user_id=user_id)
@@ -52,14 +52,19 @@
 #         },
 #         status_code=500,
 #     )
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
-from web.auth import router as auth_router
+from web.auth import get_current_user, router as auth_router
 from web.routers import router as sites_router
+from shared.config import settings
 from shared.db import init_db
+from shared.http_client import close_async_session
 from shared.logger_setup import logger
+from shared.metrics import render_latest
+from shared.notifications import refresh_queue_depth
 from datetime import datetime
+import secrets
 import traceback
 from typing import Optional
 
@@ -126,9 +131,36 @@ async def startup_event():
         raise
 
 
+async def _metrics_allowed(request: Request) -> bool:
+    if settings.metrics_token:
+        authorization = request.headers.get("Authorization", "")
+        return secrets.compare_digest(authorization, f"Bearer {settings.metrics_token}")
+    return await get_current_user(request) is not None
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    # Метрики раскрывают домены и задачи: по умолчанию выключены
+    if not settings.web_metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not await _metrics_allowed(request):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        await refresh_queue_depth()
+    except Exception as e:
+        # Остальные метрики отдаём и без Redis
+        logger.error(f"Failed to read notification queue depth: {e}")
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting Down Web Application...")
+    await close_async_session()
 
 
 @app.exception_handler(404)